@@ -1,42 +1,36 @@
-from autogen import ConversableAgent, AssistantAgent
-from autogen.coding import LocalCommandLineCodeExecutor
-from config import build_role_llm_config
-from typing import Optional, Any
+from __future__ import annotations
+
+from config import build_role_llm_config, eval_json_mode
+from feature_access import get_capability_dict, get_feature_dict
+from typing import Optional, Any, Final, TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+import atexit
+import inspect
+import io
+import json
 import os
+import sys
+try:
+    import streamlit as st  # agents are scoped to the Streamlit session when one is running
+except ImportError:
+    st = None
 
-class AgentFactory:
-    """Factory for creating agents - Factory Pattern & Dependency Inversion"""
-    
-    @staticmethod
-    def create_executor(work_dir: str = "coding", timeout: int = 300) -> tuple[LocalCommandLineCodeExecutor, ConversableAgent]:
-        """Create code executor and agent"""
-        executor = LocalCommandLineCodeExecutor(
-            timeout=timeout,
-            work_dir=work_dir,
-        )
-        
-        agent = ConversableAgent(
-            name="code_executor_agent",
-            llm_config=False,
-            code_execution_config={"executor": executor},
-            human_input_mode="NEVER",
-            default_auto_reply="Execution complete. Waiting for critic feedback.",
-        )
-        
-        return executor, agent
-    
-    @staticmethod
-    def create_writer(plot_generator: Any = None,
-                      stock_service: Any = None,
-                      user_feedback: str = None,
-                      critic_feedback: str = None) -> AssistantAgent:
-        """Create code writer agent with context (now includes user & critic feedback)."""
-        system_message = """You are a code writer that creates Python code for stock analysis.
+# autogen (pydantic, openai, ...) is imported lazily inside the builders to keep import cheap
+if TYPE_CHECKING:
+    from autogen import ConversableAgent, AssistantAgent
+    from autogen.coding import LocalCommandLineCodeExecutor
+
+# Static writer instructions; kept byte-identical across calls so the provider
+# prompt cache can reuse the prefix (Azure/OpenAI cache identical prompt prefixes).
+# Source indentation is stripped once at import so it is not billed as prompt tokens.
+WRITER_STATIC_PROMPT: Final[str] = inspect.cleandoc("""You are a code writer that creates Python code for stock analysis.
         Generate ONLY one Python code block (```python ... ```). No explanation outside the block.
         Use yfinance for data and matplotlib for plotting.
         Standalone, idempotent script:
         1. Imports
-        2. Download prices
+        2. Download prices (one batched yf.download(symbols, group_by="ticker") call, not a per-symbol loop)
         3. Compute YTD % change correctly ( (last/first - 1) * 100 )
         4. Apply requested analytical / visual features
         5. Save figure to 'ytd_stock_gains.png'
@@ -44,26 +38,221 @@ class AgentFactory:
         - Prefer one of: 'ggplot', 'classic', 'default'
         - Implement a try/fallback chain (ggplot -> classic -> default)
         - Do NOT rely on seaborn-only styles (assume seaborn not installed)
-        No Streamlit, no global side effects beyond file output."""
-        if plot_generator:
-            system_message += f"\nCurrent plot version: v{getattr(plot_generator, 'version', '?')}"
-            feature_dict = getattr(plot_generator, "current_features",
-                                   getattr(plot_generator, "features", {})) or {}
-            active_features = [k for k, v in feature_dict.items() if v and v != "default"]
-            if active_features:
-                system_message += f"\nActive plot features: {', '.join(active_features)}"
-        if stock_service:
-            system_message += f"\nData service version: v{getattr(stock_service, 'version', '?')}"
-            caps_source = getattr(stock_service, "capabilities",
-                                  getattr(stock_service, "features", {})) or {}
-            caps = [k for k, v in caps_source.items() if v]
-            if caps:
-                system_message += f"\nActive data capabilities: {', '.join(caps)}"
-        if user_feedback:
-            system_message += f"\nUser feedback to incorporate:\n{user_feedback[:800]}"
-        if critic_feedback:
-            system_message += f"\nPrevious critic feedback to address:\n{critic_feedback[:800]}"
-        system_message += "\nIf critic approved previously, still keep prior improvements."
+        No Streamlit, no global side effects beyond file output.
+        If critic approved previously, still keep prior improvements.""")
+
+CRITIC_PROMPT: Final[str] = inspect.cleandoc("""You are a code critic that evaluates stock analysis plots based on their implementation.
+        
+        Since you cannot view the actual image file, evaluate based on:
+        1. The code implementation provided
+        2. The features that have been implemented
+        3. The execution output and success messages
+        4. The plot configuration and settings
+        
+        Evaluation criteria:
+        1. Data accuracy - Is the YTD calculation correct?
+        2. Plot features - Are useful features like moving averages, annotations implemented?
+        3. Visual clarity - Based on the code, will the plot be clear and readable?
+        4. Error handling - Does the code handle potential errors?
+        5. Professional appearance - Are proper labels, titles, and formatting used?
+        
+        Provide specific feedback for improvement. If the implementation meets all criteria based on the code review, respond with 'APPROVED'.
+        Otherwise, provide constructive feedback for improvement.
+        
+        Focus on what can be improved in the next iteration.""")
+
+# Minified once at import: same schema, fewer prompt tokens than the pretty-printed form.
+# Score placeholders are numbers (not "float 0-1" strings) so the model answers with numbers;
+# the app keeps only numeric metrics. The range is stated in the rules below.
+_EVAL_SCHEMA: Final[dict] = {
+    "accuracy": 0.0,
+    "visual_clarity": 0.0,
+    "feature_completeness": 0.0,
+    "code_quality": 0.0,
+    "overall": 0.0,
+    "strengths": ["string"],
+    "issues": ["string"],
+    "blocking": ["string"],
+    "recommendation": "SHORT_SENTENCE",
+}
+_EVAL_SCHEMA_STR: Final[str] = json.dumps(_EVAL_SCHEMA, separators=(",", ":"))
+
+EVAL_PROMPT: Final[str] = (
+    "You are an impartial evaluation agent.\n"
+    f"Return ONLY a single JSON object (no markdown) with keys:\n{_EVAL_SCHEMA_STR}\n"
+    "Rules:\n"
+    "- Every score is a JSON number between 0 and 1 (not a string).\n"
+    "- Derive scores from provided code, execution result, critic feedback, and features.\n"
+    "- Do not invent features not referenced.\n"
+    "- If execution failed, accuracy <= 0.4 and overall <= 0.5.\n"
+    "- Keep each string item concise (<140 chars).\n"
+    "Output must be valid JSON (no comments).\n"
+)
+
+_DEFAULT_EXEC_REPLY: Final[str] = sys.intern("Execution complete. Waiting for critic feedback.")
+
+FEEDBACK_BYTE_BUDGET: Final[int] = 800
+
+def _truncate_bytes(text: str, limit: int = FEEDBACK_BYTE_BUDGET) -> str:
+    """Cap text at `limit` UTF-8 bytes (not code points) without splitting a character."""
+    raw = text.encode("utf-8")
+    if len(raw) <= limit:
+        return text
+    return str(memoryview(raw)[:limit], "utf-8", "ignore")
+
+_WARMUP_POOL: Optional[ThreadPoolExecutor] = None
+# Agent store used outside a Streamlit session (scripts, tests)
+_LOCAL_AGENTS: dict = {}
+
+def _session_agents() -> dict:
+    """Agents for the current Streamlit session: they carry chat history, so sessions must not share them."""
+    if st is not None:
+        try:
+            return st.session_state.setdefault("_agent_cache", {})
+        except Exception:  # no script run context (plain python, worker thread)
+            pass
+    return _LOCAL_AGENTS
+
+def _session_agent(key: Any, build) -> Any:
+    """The session's agent under `key`, awaiting a warm-up build or building it on first use."""
+    store = _session_agents()
+    agent = store.get(key)
+    if isinstance(agent, Future):
+        try:
+            agent = agent.result()
+        except Exception:
+            agent = None  # warm-up failed: build here so the error surfaces to the caller
+    if agent is None:
+        agent = build()
+    store[key] = agent
+    return agent
+
+def _build_critic(llm_config: dict) -> AssistantAgent:
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="code_critic_agent",
+        llm_config=llm_config,
+        code_execution_config=False,
+        human_input_mode="NEVER",
+        system_message=CRITIC_PROMPT
+    )
+
+def _build_llm_evaluator(llm_config: dict) -> AssistantAgent:
+    from autogen import AssistantAgent
+    if eval_json_mode():
+        # JSON mode: the decoder is constrained to a single JSON object (the prompt still asks for it)
+        llm_config["response_format"] = {"type": "json_object"}
+    return AssistantAgent(
+        name="llm_eval_agent",
+        llm_config=llm_config,
+        code_execution_config=False,
+        human_input_mode="NEVER",
+        system_message=EVAL_PROMPT
+    )
+
+def _make_executor(work_dir: str, timeout: int) -> tuple[LocalCommandLineCodeExecutor, ConversableAgent]:
+    from autogen import ConversableAgent
+    from autogen.coding import LocalCommandLineCodeExecutor
+    executor = LocalCommandLineCodeExecutor(
+        timeout=timeout,
+        work_dir=work_dir,
+    )
+    
+    agent = ConversableAgent(
+        name="code_executor_agent",
+        llm_config=False,
+        code_execution_config={"executor": executor},
+        human_input_mode="NEVER",
+        default_auto_reply=_DEFAULT_EXEC_REPLY,
+    )
+    
+    return executor, agent
+
+@lru_cache(maxsize=32)
+def _build_middle_block(plot_sig: Optional[tuple[str, str]],
+                        service_sig: Optional[tuple[str, str]]) -> str:
+    """Semi-static writer prompt block, frozen per (version, active features) signature."""
+    lines = []
+    if plot_sig:
+        version, active_features = plot_sig
+        lines.append(f"Current plot version: v{version}")
+        if active_features:
+            lines.append(f"Active plot features: {active_features}")
+    if service_sig:
+        version, caps = service_sig
+        lines.append(f"Data service version: v{version}")
+        if caps:
+            lines.append(f"Active data capabilities: {caps}")
+    return "\n".join(lines)
+
+@dataclass(slots=True, frozen=True)
+class WriterContext:
+    """Inputs for one writer agent build (hashable, built once per critic turn)."""
+    plot_generator: Any = None
+    stock_service: Any = None
+    user_feedback: Optional[str] = None
+    critic_feedback: Optional[str] = None
+
+def _writer_system_message(ctx: WriterContext) -> str:
+    plot_generator, stock_service = ctx.plot_generator, ctx.stock_service
+    user_feedback, critic_feedback = ctx.user_feedback, ctx.critic_feedback
+    # Layout keeps the provider prompt-cache prefix stable:
+    # static instructions -> semi-static version/capability block -> dynamic feedback tail.
+    buf = io.StringIO(newline="\n")
+    buf.write(WRITER_STATIC_PROMPT)
+    plot_sig = None
+    if plot_generator:
+        active_features = getattr(plot_generator, "active_features_str", None)
+        if active_features is None:  # legacy generator without the memoized string
+            feature_dict = get_feature_dict(plot_generator)
+            active_features = ", ".join(k for k, v in feature_dict.items() if v and v != "default")
+        plot_sig = (str(getattr(plot_generator, "version", "?")), active_features)
+    service_sig = None
+    if stock_service:
+        caps = getattr(stock_service, "active_features_str", None)
+        if caps is None:
+            caps_source = get_capability_dict(stock_service)
+            caps = ", ".join(k for k, v in caps_source.items() if v)
+        service_sig = (str(getattr(stock_service, "version", "?")), caps)
+    middle = _build_middle_block(plot_sig, service_sig)
+    if middle:
+        buf.writelines(("\n", middle))
+    if user_feedback:
+        buf.writelines(("\nUser feedback to incorporate:\n", _truncate_bytes(user_feedback)))
+    if critic_feedback:
+        buf.writelines(("\nPrevious critic feedback to address:\n", _truncate_bytes(critic_feedback)))
+    return buf.getvalue()
+
+class AgentFactory:
+    """Factory for creating agents - Factory Pattern & Dependency Inversion"""
+    
+    @staticmethod
+    def warm_up() -> None:
+        """Start building this session's critic/evaluator agents in the background."""
+        global _WARMUP_POOL
+        if _WARMUP_POOL is None:
+            _WARMUP_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-warmup")
+            atexit.register(_WARMUP_POOL.shutdown, wait=False)
+        # Store and role config are resolved on the caller's thread: both read Streamlit
+        # session_state, which is only reachable from the script thread
+        store = _session_agents()
+        if "critic" not in store:
+            store["critic"] = _WARMUP_POOL.submit(_build_critic, build_role_llm_config("critic"))
+        if "llm_evaluator" not in store:
+            store["llm_evaluator"] = _WARMUP_POOL.submit(_build_llm_evaluator, build_role_llm_config("critic"))
+    
+    @staticmethod
+    def create_executor(work_dir: str = "coding", timeout: int = 300) -> tuple[LocalCommandLineCodeExecutor, ConversableAgent]:
+        """Return this session's executor/agent pair for (work_dir, timeout); agent history is cleared."""
+        executor, agent = _session_agent(("executor", work_dir, timeout), lambda: _make_executor(work_dir, timeout))
+        agent.reset()
+        return executor, agent
+    
+    @staticmethod
+    def create_writer(ctx: WriterContext) -> AssistantAgent:
+        """Create code writer agent with context (now includes user & critic feedback)."""
+        system_message = _writer_system_message(ctx)
+        from autogen import AssistantAgent
         return AssistantAgent(
             name="code_writer_agent",
             llm_config=build_role_llm_config("writer"),
@@ -72,61 +261,27 @@ class AgentFactory:
             system_message=system_message
         )
     
+    @staticmethod
+    def refresh_writer(agent: AssistantAgent, ctx: WriterContext) -> AssistantAgent:
+        """Reuse an existing writer agent with a new context (only the system message changes)."""
+        agent.update_system_message(_writer_system_message(ctx))
+        return agent
+    
+    @staticmethod
+    def create_writer_legacy(**kwargs: Any) -> AssistantAgent:
+        """Keyword-argument shim for callers predating WriterContext."""
+        return AgentFactory.create_writer(WriterContext(**kwargs))
+    
     @staticmethod
     def create_critic() -> AssistantAgent:
-        """Create critic agent for code review"""
-        return AssistantAgent(
-            name="code_critic_agent",
-            llm_config=build_role_llm_config("critic"),
-            code_execution_config=False,
-            human_input_mode="NEVER",
-            system_message="""You are a code critic that evaluates stock analysis plots based on their implementation.
-            
-            Since you cannot view the actual image file, evaluate based on:
-            1. The code implementation provided
-            2. The features that have been implemented
-            3. The execution output and success messages
-            4. The plot configuration and settings
-            
-            Evaluation criteria:
-            1. Data accuracy - Is the YTD calculation correct?
-            2. Plot features - Are useful features like moving averages, annotations implemented?
-            3. Visual clarity - Based on the code, will the plot be clear and readable?
-            4. Error handling - Does the code handle potential errors?
-            5. Professional appearance - Are proper labels, titles, and formatting used?
-            
-            Provide specific feedback for improvement. If the implementation meets all criteria based on the code review, respond with 'APPROVED'.
-            Otherwise, provide constructive feedback for improvement.
-            
-            Focus on what can be improved in the next iteration."""
-        )
+        """Return this session's critic agent (built once per session; chat history cleared on reuse)."""
+        agent = _session_agent("critic", lambda: _build_critic(build_role_llm_config("critic")))
+        agent.reset()
+        return agent
     
     @staticmethod
     def create_llm_evaluator() -> AssistantAgent:
-        """Create an LLM evaluator agent that outputs strict JSON with scores."""
-        return AssistantAgent(
-            name="llm_eval_agent",
-            llm_config=build_role_llm_config("critic"),
-            code_execution_config=False,
-            human_input_mode="NEVER",
-            system_message="""You are an impartial evaluation agent. 
-Return ONLY a single JSON object (no markdown) with keys:
-{
- "accuracy": float 0-1,
- "visual_clarity": float 0-1,
- "feature_completeness": float 0-1,
- "code_quality": float 0-1,
- "overall": float 0-1,
- "strengths": [string,...],
- "issues": [string,...],
- "blocking": [string,...],
- "recommendation": "SHORT_SENTENCE"
-}
-Rules:
-- Derive scores from provided code, execution result, critic feedback, and features.
-- Do not invent features not referenced.
-- If execution failed, accuracy <= 0.4 and overall <= 0.5.
-- Keep each string item concise (<140 chars).
-Output must be valid JSON (no comments).
-"""
-        )
+        """Return this session's LLM evaluator agent that outputs strict JSON with scores."""
+        agent = _session_agent("llm_evaluator", lambda: _build_llm_evaluator(build_role_llm_config("critic")))
+        agent.reset()
+        return agent
@@ -3,37 +3,190 @@ import datetime
 from feedback_evaluator import FeedbackEvaluator
 from stock_service import StockDataService
 from plot_generator import PlotGenerator
-from artifacts_manager import ArtifactsManager
+from artifacts_manager import ArtifactsManager, AsyncArtifactWriter
 from code_generator import CodeGenerator
+from feature_access import get_feature_dict
+try:  # autogen is imported lazily by the factory; failures here only disable non-mock mode
+    from agent_factory import AgentFactory, WriterContext
+except Exception:
+    AgentFactory = WriterContext = None
+import copy
+import hashlib
+import io
 import os
-import shutil  # NEW
+from os import PathLike
+import subprocess
+import sys
+import time
 from pathlib import Path
 import re  # added
 import json
+try:
+    import orjson  # optional: faster LLM-eval JSON parsing
+except ImportError:
+    orjson = None
+try:
+    from PIL import Image  # ships with matplotlib; used for gallery thumbnails
+except ImportError:
+    Image = None
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+import pandas as pd
+
+# --- Precompiled patterns (helpers below run per line / per critic turn) ---
+# One pass: leading bullets | runs of whitespace | trailing duplicate punctuation
+_CLEAN_RE = re.compile(r'(?P<bullet>^[\-\*\u2022]+\s*)|(?P<space>\s{2,})|(?P<punct>[:;,\.\!])(?P=punct)+$')
+_CLEAN_REPL = {"bullet": lambda m: '', "space": lambda m: ' ', "punct": lambda m: m.group('punct')}
+
+def _clean_dispatch(m):
+    return _CLEAN_REPL[m.lastgroup](m)
+_PY_CODE_RE = re.compile(r"```python\s+([\s\S]*?)```", re.IGNORECASE)
+_ANY_CODE_RE = re.compile(r"```([\s\S]*?)```")
+_STYLE_USE_RE = re.compile(r"(?P<indent>^[ \t]*)plt\.style\.use\(([^)]+)\)", re.MULTILINE)
+_JSON_BRACE_RE = re.compile(r'\{[\s\S]*\}')
+_MPL_IMPORT_RE = re.compile(r'^.*(?:import matplotlib\.pyplot|from matplotlib).*$', re.MULTILINE)
+
+_STYLE_FALLBACK_BLOCK = (
+    "try:\n    import matplotlib.pyplot as plt  # ensure plt defined\n"
+    "    for _s in ['ggplot','classic','default']:\n"
+    "        try:\n"
+    "            plt.style.use(_s)\n"
+    "            break\n"
+    "        except OSError:\n"
+    "            pass\n"
+    "except Exception:\n    pass"
+)
+_STYLE_PREPEND_BLOCK = (
+    "import matplotlib.pyplot as plt\n"
+    "try:\n"
+    "    for _s in ['ggplot','classic','default']:\n"
+    "        try:\n"
+    "            plt.style.use(_s)\n"
+    "            break\n"
+    "        except OSError:\n"
+    "            pass\n"
+    "except Exception:\n    pass"
+)
+
+# Plot scripts run under the same interpreter as the app (not whatever "python" is on PATH);
+# skip .pyc writes for the throwaway script
+_PLOT_RUN_CMD = [sys.executable, "plot_script.py"]
+_PLOT_RUN_ENV = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+
+def _decode_head(data: bytes, n: int) -> str:
+    """Decode only the first n bytes of captured output (a split multi-byte char is replaced)."""
+    return data[:n].decode("utf-8", "replace") if data else ""
+
+def _write_bytes_fast(path, data: bytes):
+    """Single open/write/close via raw fds (no TextIOWrapper/buffer setup)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+# --- NEW: cached image payloads (keyed on mtime so a rewritten PNG is re-read) ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def _img_bytes(path: str, mtime: float) -> bytes:
+    return Path(path).read_bytes()
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _thumb_bytes(path: str, mtime: float, width: int = 480) -> bytes:
+    """Downscaled PNG for the version gallery; full bytes when Pillow is unavailable."""
+    if Image is None:
+        return _img_bytes(path, mtime)
+    with Image.open(path) as im:
+        im.thumbnail((width, width * 4))
+        buf = io.BytesIO()
+        im.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+def _show_image(path: str, thumbnail: bool = False, **kwargs):
+    """st.image from cached bytes instead of re-reading the file on every rerun."""
+    path = str(path)
+    loader = _thumb_bytes if thumbnail else _img_bytes
+    try:
+        data = loader(path, os.path.getmtime(path))
+    except OSError:
+        # deleted after _fast_exists cached it (removed outside the app): forget it and skip
+        _known_files().discard(path)
+        return
+    st.image(data, **kwargs)
+# --- END NEW ---
+
+# --- Per-turn prompt templates (filled with a params dict) ---
+_WRITER_PROMPT_PREFIX = (
+    "Generate improved stock YTD code for symbols %s.\n"
+    "Requirements:\n- Correct YTD %% change from first trading day of year\n"
+    "- Save figure as ytd_stock_gains.png\n"
+    "- Implement active features & address feedback\n"
+    "- Add clear title, legend, labels, grid (if appropriate)\n"
+    "- No Streamlit usage\n"
+)
+_WRITER_FIX_HINT = "Ensure indentation & try/except blocks are syntactically correct.\n"
+_CRITIC_CONTEXT_TPL = (
+    "\nEvaluate implementation (turn %(turn)d):\n"
+    "Symbols: %(symbols)s\n"
+    "Version: v%(version)s\n"
+    "Active features: %(features)s\n"
+    "Execution success: %(success)s\n"
+    "Regen attempts used: %(attempts)s/%(max_attempts)s\n"
+    "Plot file: %(plot_file)s\n"
+    "Last error (if any): %(last_error)s\n"
+    "Recent user feedback: %(user_feedback)s\n"
+    "Previous critic feedback: %(prev_critic)s\n"
+    "Code (truncated):\n"
+    "%(code)s\n"
+    "Stdout/Err (truncated):\n"
+    "%(output)s\n"
+    "Provide concise improvement feedback. If fully satisfactory, include 'APPROVED'.\n"
+)
+_EVAL_PROMPT_TPL = (
+    "\nProvide JSON evaluation (0-1 floats) for criteria: %(criteria)s.\n"
+    "Context:\n"
+    "Execution success: %(success)s\n"
+    "Plot generated: %(plot)s\n"
+    "Critic feedback: %(critic_feedback)s\n"
+    "Selected features: %(features)s\n"
+    "Code snippet:\n"
+    "%(code)s\n"
+    "If execution failed, penalize accuracy & overall.\n"
+    "Return ONLY JSON.\n"
+)
+
+def _clip(s: str, n: int) -> str:
+    """Truncate to n chars, returning s itself (no copy) when already short enough."""
+    return s if len(s) <= n else s[:n]
 
 # --- new helper: feedback formatter ---
 def _normalize_feedback_lines(lines):
+    # per-priority and consolidated views overlap heavily: memoize on the (hashable) item tuple
+    return list(_normalize_feedback_lines_cached(tuple(lines)))
+
+@lru_cache(maxsize=512)
+def _normalize_feedback_lines_cached(lines: tuple) -> tuple:
     cleaned = []
     seen = set()
     for line in lines:
         if not line:
             continue
-        # Strip bullets / whitespace
-        line = re.sub(r'^[\-\*\u2022]+\s*', '', line).strip()
-        # Fix common concatenations
-        line = line.replace(")andax", ") and ax").replace(")and ax", ") and ax")
-        line = line.replace("YTD % Change')and", "YTD % Change') and")
-        # Compress spaces
-        line = re.sub(r'\s{2,}', ' ', line)
+        # Strip bullets, compress spaces, drop trailing duplicate punctuation
+        line = _CLEAN_RE.sub(_clean_dispatch, line.strip())
+        # Fix common concatenations (all share the ')and' substring)
+        if ")and" in line:
+            line = line.replace(")andax", ") and ax").replace(")and ax", ") and ax")
+            line = line.replace("YTD % Change')and", "YTD % Change') and")
         # Capitalize first letter if sentence-like
         if line and not line[0].isupper():
             line = line[0].upper() + line[1:]
-        # Remove trailing duplicate punctuation
-        line = re.sub(r'([:;,\.\!])\1+$', r'\1', line)
-        if line.lower() not in seen:
-            seen.add(line.lower())
+        key = line.casefold()
+        if key not in seen:
+            seen.add(key)
             cleaned.append(line)
-    return cleaned
+    return tuple(cleaned)
 
 # --- new helper: version display mapping ---
 def _display_version(internal_version: int) -> int:
@@ -48,23 +201,24 @@ def _display_version(internal_version: int) -> int:
     # If you want baseline shown as v0 instead, uncomment:
     # return max(0, internal_version - 1)
 
+@lru_cache(maxsize=128)
 def _extract_python_code(text: str) -> str:
     """
     Extract first ```python ... ``` block; fallback to any ```...```; else return original.
     """
     if not text:
         return text
-    code_block = re.search(r"```python\s+([\s\S]*?)```", text, re.IGNORECASE)
+    code_block = _PY_CODE_RE.search(text)
     if not code_block:
-        code_block = re.search(r"```([\s\S]*?)```", text)
+        code_block = _ANY_CODE_RE.search(text)
     return code_block.group(1).strip() if code_block else text.strip()
 
+@lru_cache(maxsize=256)
 def _inject_style_fallback(code: str) -> str:
     """
     Wrap first plt.style.use(...) with robust fallback while preserving indentation.
     """
-    pattern = r"(?P<indent>^[ \t]*)plt\.style\.use\(([^)]+)\)"
-    if re.search(pattern, code, flags=re.MULTILINE):
+    if _STYLE_USE_RE.search(code):
         def repl(m):
             indent = m.group('indent')
             arg = m.group(2)
@@ -80,103 +234,354 @@ def _inject_style_fallback(code: str) -> str:
                 f"{indent}            pass"
             )
             return block
-        code = re.sub(pattern, repl, code, count=1, flags=re.MULTILINE)
+        code = _STYLE_USE_RE.sub(repl, code, count=1)
     else:
-        # Insert after first matplotlib import
-        lines = code.splitlines()
-        inserted = False
-        for i, line in enumerate(lines):
-            if ("import matplotlib.pyplot" in line or "from matplotlib" in line) and not inserted:
-                lines.insert(
-                    i + 1,
-                    "try:\n    import matplotlib.pyplot as plt  # ensure plt defined\n"
-                    "    for _s in ['ggplot','classic','default']:\n"
-                    "        try:\n"
-                    "            plt.style.use(_s)\n"
-                    "            break\n"
-                    "        except OSError:\n"
-                    "            pass\n"
-                    "except Exception:\n    pass"
-                )
-                inserted = True
-                break
-        if not inserted:
+        # Insert after first matplotlib import (single regex pass)
+        code, n = _MPL_IMPORT_RE.subn(lambda m: m.group(0) + "\n" + _STYLE_FALLBACK_BLOCK, code, count=1)
+        if n == 0:
             # Prepend as last resort
-            lines.insert(0,
-                "import matplotlib.pyplot as plt\n"
-                "try:\n"
-                "    for _s in ['ggplot','classic','default']:\n"
-                "        try:\n"
-                "            plt.style.use(_s)\n"
-                "            break\n"
-                "        except OSError:\n"
-                "            pass\n"
-                "except Exception:\n    pass"
-            )
-        code = "\n".join(lines)
+            code = _STYLE_PREPEND_BLOCK + "\n" + code
     return code
 
+@lru_cache(maxsize=64)
+def _prepare_executable(raw_reply: str) -> str:
+    """Writer reply -> runnable code (style fallback injected); "" means use the template generator."""
+    code = _extract_python_code(raw_reply)
+    if not code or "yfinance" not in code:
+        return ""
+    return _inject_style_fallback(code)
+
 def _safe_parse_llm_eval(text: str) -> dict:
     """Extract and parse first JSON object from text; return dict or fallback."""
     if not text:
         return {}
-    # Attempt direct parse
-    try:
-        return json.loads(text)
-    except:
-        pass
+    parsed = _parse_llm_eval_cached(text)
+    # copy: callers may keep/mutate the result; non-object JSON is treated as no result
+    return dict(parsed) if isinstance(parsed, dict) else {}
+
+_JSON_DECODER = json.JSONDecoder()
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+@lru_cache(maxsize=128)
+def _parse_llm_eval_cached(text: str):
+    # Cheap pre-check: only attempt a direct parse when the reply starts with an object
+    stripped = text.lstrip()
+    if stripped.startswith('{'):
+        try:
+            return _json_loads(stripped)
+        except ValueError:  # json/orjson JSONDecodeError both subclass ValueError
+            pass
+        try:  # tolerate trailing prose after the object
+            return _JSON_DECODER.raw_decode(stripped)[0]
+        except ValueError:
+            pass
     # Try to isolate JSON braces
-    m = re.search(r'\{[\s\S]*\}', text)
+    m = _JSON_BRACE_RE.search(text)
     if m:
         try:
-            return json.loads(m.group(0))
-        except:
+            return _json_loads(m.group(0))
+        except ValueError:
             return {}
     return {}
 
 # --- NEW: unified feature access helpers ---
-def _get_feature_dict(pg):
-    """Return plot feature dict supporting both legacy 'current_features' and new 'features'."""
-    return getattr(pg, "current_features", getattr(pg, "features", {})) or {}
+def _get_active_features(pg) -> tuple:
+    """Return normalized active feature names as a tuple (exclude falsy/default)."""
+    return tuple(k for k, v in get_feature_dict(pg).items() if v and v != "default")
 
-def _get_active_features(pg):
-    """Return normalized active feature list (exclude falsy/default)."""
-    return [k for k, v in _get_feature_dict(pg).items() if v and v != "default"]
+@lru_cache(maxsize=64)
+def _join_features(keys: tuple) -> str:
+    """Comma-join feature names; memoized per (ordered) key tuple."""
+    return ", ".join(keys)
 # --- END NEW ---
 
 # --- NEW: safe path existence helper ---
-def _safe_exists(p) -> bool:
-    from os import PathLike
-    return isinstance(p, (str, PathLike)) and bool(p) and os.path.exists(p)
+def _known_files() -> set:
+    """Per-session set of plot files known to exist (entries dropped when a read fails)."""
+    return st.session_state.setdefault("_known_files", set())
+
+def _mark_file(p):
+    """Record a file this session just created."""
+    _known_files().add(os.fspath(p))
+
+def _fast_exists(p) -> bool:
+    """Safe path existence check with a per-session positive cache, so reruns skip repeat stat() calls."""
+    if not p or not isinstance(p, (str, PathLike)):
+        return False
+    p = os.fspath(p)
+    known = _known_files()
+    if p in known:
+        return True
+    if os.path.lexists(p):
+        known.add(p)
+        return True
+    return False
 # --- END NEW ---
 
-# --- NEW: clear coding workspace helper ---
-def _clear_coding_dir(dir_name: str = "coding"):
-    p = Path(dir_name)
-    if not p.exists():
-        p.mkdir(parents=True, exist_ok=True)
+# --- NEW: background artifact persistence ---
+def _snapshot(obj, *attrs):
+    """Shallow copy with the named mutable attributes copied, safe to persist later."""
+    snap = copy.copy(obj)
+    for name in attrs:
+        setattr(snap, name, copy.copy(getattr(obj, name)))
+    return snap
+
+def _queue_save_iteration(**kwargs):
+    """Queue ArtifactsManager.save_iteration on the session's background writer."""
+    kwargs["plot_generator"] = _snapshot(kwargs["plot_generator"],
+                                         "features", "history", "improvements", "plot_history")
+    kwargs["stock_service"] = _snapshot(kwargs["stock_service"], "capabilities", "history")
+    if kwargs.get("stock_data"):
+        # frames are enriched in place on later runs; hand the writer its own copies
+        kwargs["stock_data"] = {s: df.copy() for s, df in kwargs["stock_data"].items()}
+    _lazy_state("artifact_writer", AsyncArtifactWriter).submit(
+        st.session_state.artifacts_manager.save_iteration, **kwargs)
+
+def _flush_artifacts():
+    """Wait for queued artifact writes; surface any failures."""
+    writer = st.session_state.get("artifact_writer")
+    if writer is None:  # nothing was ever queued this session
         return
-    for item in p.iterdir():
-        try:
-            if item.is_file() or item.is_symlink():
-                item.unlink()
-            elif item.is_dir():
-                shutil.rmtree(item)
-        except Exception:
-            pass
+    for err in writer.flush():
+        st.warning(f"Artifact save failed: {err}")
+# --- END NEW ---
+
+# --- NEW: lazily constructed session services ---
+def _lazy_state(key: str, factory):
+    """Return st.session_state[key], building it with factory() on first use."""
+    obj = st.session_state.get(key)
+    if obj is None:
+        obj = factory()
+        st.session_state[key] = obj
+    return obj
+
+def _ensure_session_services():
+    """Build the generation-time services (deferred until the first analysis run)."""
+    _lazy_state("plot_generator", PlotGenerator)
+    _lazy_state("stock_service", StockDataService)
+    _lazy_state("evaluator", FeedbackEvaluator)
+    _lazy_state("artifact_writer", AsyncArtifactWriter)
+# --- END NEW ---
+
+# Mock-mode critic script (distinct entries; the mock loop stops once they are used up)
+_MOCK_CRITIC_FEEDBACK = (
+    "The plot needs moving averages for better trend visibility. Add 20-day and 50-day MA.",
+    "Good progress! Now add volume analysis in a subplot below the main chart.",
+    "Excellent! The plot is clear and informative. APPROVED",
+)
+
+# --- NEW: critic plateau (patience) early stop ---
+CRITIC_PATIENCE = 2   # consecutive non-improving turns tolerated
+CRITIC_TOL = 0.02     # minimum score gain that counts as improvement
+
+class _PlateauTracker:
+    """Track best critic score; report a plateau after `patience` turns without a `tol` gain."""
+
+    def __init__(self, patience: int = CRITIC_PATIENCE, tol: float = CRITIC_TOL):
+        self.patience = patience
+        self.tol = tol
+        self.best = float("-inf")
+        self.stale = 0
+
+    def update(self, score: float) -> bool:
+        if score > self.best + self.tol:
+            self.best = score
+            self.stale = 0
+        else:
+            self.stale += 1
+        return self.stale >= self.patience
+# --- END NEW ---
+
+# --- NEW: incremental LLM eval history ---
+def _append_llm_eval_row(turn: int, parsed: dict):
+    """Append one turn's numeric scores to the session eval DataFrame (only the new row is built)."""
+    row = pd.DataFrame([{"turn": turn, **{k: v for k, v in parsed.items() if isinstance(v, (int, float))}}])
+    df = st.session_state.llm_eval_df
+    st.session_state.llm_eval_df = row if df.empty else pd.concat([df, row], ignore_index=True)
+# --- END NEW ---
+
+# --- NEW: user feedback section as a fragment ---
+# Widget interactions inside a fragment rerun only the fragment, not the sidebar/critic output.
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+@_fragment
+def _user_feedback_section(mock_mode: bool, save_png: bool):
+    """Satisfaction radio, feedback inputs and submit handling for the current outer iteration."""
+    st.subheader("👤 User Feedback")
+    # Radio persists independently of button state
+    user_satisfied = st.radio(
+        "Are you satisfied with the current plot?",
+        ["Yes, looks great!", "No, needs improvement", "Getting better, but not there yet"],
+        key=f"satisfaction_{st.session_state.outer_iteration}",
+        index=0
+    )
+
+    current_plot_file = st.session_state.get("current_plot_file")
+    stock_data = st.session_state.get("stock_data")
+
+    if _fast_exists(current_plot_file):
+        _show_image(current_plot_file, caption=f"Current Plot (v{_display_version(st.session_state.plot_generator.version)})")
+    elif not save_png and st.session_state.get("current_figure") is not None:
+        st.plotly_chart(st.session_state.current_figure, use_container_width=True)
+
+    if user_satisfied == "Yes, looks great!":
+        st.success("🎉 Great! The plot evolution is complete!")
+        # Generate evolution report
+        _flush_artifacts()
+        report = st.session_state.artifacts_manager.generate_evolution_report()
+        
+        # Final summary
+        with st.expander("📊 Final Evolution Summary"):
+            summary = st.session_state.plot_generator.get_evolution_summary()
+            st.json(summary)
+            
+            # Show evolution report
+            st.markdown("### 📝 Evolution Report")
+            st.markdown(report)
+            
+            # Show saved artifacts location
+            if st.session_state.artifacts_manager.current_case_dir:
+                st.info(f"📁 Artifacts saved to: {st.session_state.artifacts_manager.current_case_dir}")
+    else:
+        st.info("Let's improve the plot based on your feedback!")
+        simple_feedback = st.text_area(
+            "Describe what needs improvement:",
+            placeholder="e.g., Add volume data; use clearer colors; include moving averages",
+            key=f"simple_feedback_{st.session_state.outer_iteration}",
+            height=100
+        )
+        user_feedback_parts = []
+        # Built only while toggled on (a collapsed expander still creates every widget each rerun)
+        if st.checkbox("📋 Advanced Feedback Options", key=f"adv_open_{st.session_state.outer_iteration}"):
+            feedback_type = st.radio(
+                "Choose feedback method:",
+                ["Quick Text", "Guided Questions", "Checkboxes", "Combined"],
+                key=f"feedback_type_{st.session_state.outer_iteration}"
+            )
+            if feedback_type in ["Guided Questions", "Combined"]:
+                st.write("**🎯 Answer these questions:**")
+                q1 = st.text_input("1. First impression?", key=f"q1_{st.session_state.outer_iteration}")
+                if q1: user_feedback_parts.append(f"First impression: {q1}")
+                q2 = st.text_input("2. Missing data?", key=f"q2_{st.session_state.outer_iteration}")
+                if q2: user_feedback_parts.append(f"Missing: {q2}")
+                q3 = st.text_input("3. Visual improvements?", key=f"q3_{st.session_state.outer_iteration}")
+                if q3: user_feedback_parts.append(f"Visual: {q3}")
+            if feedback_type in ["Checkboxes", "Combined"]:
+                st.write("**☑️ Quick selections:**")
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.checkbox("Add Moving Averages", key=f"cb_ma_{st.session_state.outer_iteration}"):
+                        user_feedback_parts.append("Add moving averages")
+                    if st.checkbox("Add Volume", key=f"cb_vol_{st.session_state.outer_iteration}"):
+                        user_feedback_parts.append("Add volume subplot")
+                    if st.checkbox("Add Annotations", key=f"cb_ann_{st.session_state.outer_iteration}"):
+                        user_feedback_parts.append("Add price annotations")
+                with col2:
+                    if st.checkbox("Better Colors", key=f"cb_col_{st.session_state.outer_iteration}"):
+                        user_feedback_parts.append("Improve colors")
+                    if st.checkbox("Improve Labels", key=f"cb_lab_{st.session_state.outer_iteration}"):
+                        user_feedback_parts.append("Better labels")
+                    if st.checkbox("Add Grid", key=f"cb_grid_{st.session_state.outer_iteration}"):
+
+                        user_feedback_parts.append("Enhance grid")
+
+        priority = st.select_slider(
+            "How important are these changes?",
+            options=["Nice to have", "Important", "Critical"],
+            value="Important",
+            key=f"priority_{st.session_state.outer_iteration}"
+        )
+
+        if st.button("📤 Submit Feedback", type="primary", key=f"submit_{st.session_state.outer_iteration}"):
+            if not (simple_feedback or user_feedback_parts):
+                st.warning("⚠️ Please provide some feedback before submitting")
+            else:
+                final_feedback = f"[Priority: {priority}]\n\n"
+                if simple_feedback:
+                    final_feedback += f"User request: {simple_feedback}\n\n"
+                if user_feedback_parts:
+                    final_feedback += "Additional details:\n" + "\n".join(f"• {p}" for p in user_feedback_parts)
+                st.session_state.user_feedback = final_feedback
+                st.session_state.evaluator.store_feedback(final_feedback, "user", st.session_state.outer_iteration)
+                st.session_state.plot_generator.evolve(final_feedback, "user")
+                st.session_state.stock_service.evolve(final_feedback)
+                st.session_state.total_iterations += 1
+                current_plot_for_artifacts = current_plot_file
+                if not current_plot_for_artifacts and st.session_state.plot_generator.plot_history:
+                    current_plot_for_artifacts = st.session_state.plot_generator.plot_history[-1]['filename']
+                if stock_data is not None:
+                    _queue_save_iteration(
+                        iteration=st.session_state.total_iterations,
+                        iteration_type="user",
+                        plot_generator=st.session_state.plot_generator,
+                        stock_service=st.session_state.stock_service,
+                        feedback=final_feedback,
+                        plot_path=current_plot_for_artifacts,
+                        stock_data=stock_data
+                    )
+                st.success(f"✅ Feedback received! Services evolved to v{st.session_state.plot_generator.version}")
+                with st.expander("📋 Feedback Processed", expanded=True):
+                    st.text(final_feedback)
+                st.info("👉 Click 'Start Analysis' again to run the next evolution cycle.")
+                # write-behind: serialized on the artifact thread, bursts coalesce to the newest snapshot
+                _lazy_state("artifact_writer", AsyncArtifactWriter).submit_coalesced(
+                    "coding/plot_state.json", PlotGenerator.write_state,
+                    "coding/plot_state.json", st.session_state.plot_generator.to_dict()
+                )
+
+                # --- NEW: Critic evaluation after user feedback (non-mock mode) ---
+                if not mock_mode and AgentFactory is not None:
+                    try:
+                        # process-wide critic singleton (history reset), same instance the critic loop uses
+                        post_critic = AgentFactory.create_critic()
+                        active_features = _get_active_features(st.session_state.plot_generator)  # CHANGED
+                        post_context = f"""
+Evaluate newly applied USER feedback changes.
+
+Version: v{st.session_state.plot_generator.version}
+Active features now: {_join_features(active_features) if active_features else 'basic'}
+User feedback just applied:
+{final_feedback[:1200]}
+
+Assess:
+1. Does feedback align with prior critic guidance?
+2. Any missing high-impact enhancements?
+3. Next concrete step (one sentence) unless complete.
+
+If no further improvements strongly needed, include token: USER_FEEDBACK_OK
+Provide concise response."""
+                        post_reply = post_critic.generate_reply(
+                            messages=[{"content": post_context, "role": "user"}]
+                        )
+                        post_reply_text = post_reply if isinstance(post_reply, str) else str(post_reply)
+                        st.session_state.last_critic_feedback = post_reply_text
+                        st.session_state.evaluator.store_feedback(
+                            post_reply_text, "critic_post_user", st.session_state.outer_iteration
+                        )
+                        # Save as its own iteration artifact
+                        st.session_state.total_iterations += 1
+                        _queue_save_iteration(
+                            iteration=st.session_state.total_iterations,
+                            iteration_type="critic_post_user",
+                            plot_generator=st.session_state.plot_generator,
+                            stock_service=st.session_state.stock_service,
+                            feedback=post_reply_text,
+                            plot_path=current_plot_for_artifacts,
+                            stock_data=stock_data
+                        )
+                        with st.expander("🤖 Critic Evaluation Of User Feedback", expanded=True):
+                            st.write(post_reply_text)
+                    except Exception as e:
+                        st.warning(f"Post-feedback critic evaluation failed: {e}")
+                # --- END NEW ---
+                _flush_artifacts()
 # --- END NEW ---
 
 def main():
     st.title("📈 Evolving Stock Analysis with AG2")
     st.markdown("Generate YTD stock plots that evolve based on AI and user feedback")
     
-    # Initialize session state
-    if "plot_generator" not in st.session_state:
-        st.session_state.plot_generator = PlotGenerator()
-    if "stock_service" not in st.session_state:
-        st.session_state.stock_service = StockDataService()
-    if "evaluator" not in st.session_state:
-        st.session_state.evaluator = FeedbackEvaluator()
+    # Initialize session state (plot/stock/evaluator services are built lazily on first analysis)
     if "artifacts_manager" not in st.session_state:
         st.session_state.artifacts_manager = ArtifactsManager()
     if "outer_iteration" not in st.session_state:
@@ -193,8 +598,15 @@ def main():
         st.session_state.last_execution_error = None
     if "llm_eval_results" not in st.session_state:
         st.session_state.llm_eval_results = []
+    if "llm_eval_df" not in st.session_state:
+        # numeric LLM-eval scores, one row per parsed turn (appended as results arrive)
+        st.session_state.llm_eval_df = pd.DataFrame()
     if "critic_feedback_window" not in st.session_state:
-        st.session_state.critic_feedback_window = []  # rolling list of critic feedback strings
+        # rolling window of critic feedback strings (hard cap 20 for memory safety)
+        st.session_state.critic_feedback_window = deque(maxlen=20)
+    if "coding_dir" not in st.session_state:
+        st.session_state.coding_dir = Path("coding")
+        st.session_state.coding_dir.mkdir(exist_ok=True)
     
     # Sidebar configuration
     with st.sidebar:
@@ -202,6 +614,10 @@ def main():
         
         # Add mock mode toggle
         mock_mode = st.checkbox("Mock Mode (No Azure Required)", value=True)
+        save_png = st.checkbox(
+            "Save PNG artifact", value=True,
+            help="Uncheck to render mock-mode plots as interactive Plotly charts (no matplotlib/PNG per turn)"
+        )
         
         # Case name input - simplified default without date
         case_name = st.text_input(
@@ -269,9 +685,10 @@ def main():
         )
         
         # Display evolution summary
-        if st.session_state.plot_generator.version > 1:
+        pg = st.session_state.get("plot_generator")
+        if pg is not None and pg.version > 1:
             st.subheader("📊 Evolution Summary")
-            summary = st.session_state.plot_generator.get_evolution_summary()
+            summary = pg.get_evolution_summary()
             shown_version = _display_version(summary["current_version"])
             st.metric("Current Version", shown_version)
             st.metric("Total Improvements", summary["total_improvements"])
@@ -302,8 +719,10 @@ def main():
         
         # Reset button
         if st.button("🔄 Reset Evolution"):
-            st.session_state.plot_generator = PlotGenerator()
-            st.session_state.evaluator = FeedbackEvaluator()
+            _flush_artifacts()
+            # dropped here; rebuilt lazily on the next analysis run
+            st.session_state.pop("plot_generator", None)
+            st.session_state.pop("evaluator", None)
             st.session_state.outer_iteration = 0
             st.session_state.total_iterations = 0
             st.rerun()
@@ -311,6 +730,7 @@ def main():
     # Main content area
     if generate_button:
         st.session_state.analysis_started = True
+        _ensure_session_services()
         symbols = [s.strip().upper() for s in symbols_input.split(",")]
         
         if not symbols or not all(symbols):
@@ -324,6 +744,13 @@ def main():
             case_dir = st.session_state.artifacts_manager.create_case(full_case_name, symbols)
             st.info(f"📁 Created case: {case_dir.name}")
         
+        if not mock_mode:
+            if AgentFactory is None:
+                st.error("Agent support is unavailable (agent_factory failed to import). Enable Mock Mode.")
+                return
+            # Build shared critic/evaluator agents while the data download runs
+            AgentFactory.warm_up()
+        
         # Fetch stock data once
         with st.spinner("Fetching stock data..."):
             try:
@@ -352,16 +779,20 @@ def main():
         st.subheader("🤖 AI Critic Feedback Loop")
         
         # Initialize critic_feedback_history outside of conditional blocks
-        critic_feedback_history = []
+        # (preallocated to the turn bound; filled by index, consumed as [:n_critic_feedback])
+        critic_feedback_history = [None] * max_critic_turns
+        n_critic_feedback = 0
+        plateau = _PlateauTracker()
+        stop_reason = "max_turns"
         
         if not mock_mode:
             # Original critic feedback loop with Azure
-            from agent_factory import AgentFactory
-            
             with st.spinner("Setting up agents..."):
                 factory = AgentFactory()
                 executor, executor_agent = factory.create_executor()
                 critic_agent = factory.create_critic()
+            writer_agent = None  # built on the first critic turn, then reused
+            llm_eval_agent = None
             
             # Prepare initial message
             today = datetime.datetime.now().date()
@@ -389,73 +820,84 @@ def main():
             if st.session_state.plot_generator.version > 1:
                 active_features = _get_active_features(st.session_state.plot_generator)  # CHANGED
                 if active_features:
-                    message += f"\n\nImplement these features in the plot: {', '.join(active_features)}"
+                    message += f"\n\nImplement these features in the plot: {_join_features(active_features)}"
             
             for critic_turn in range(max_critic_turns):
                 st.write(f"**Critic Turn {critic_turn + 1}/{max_critic_turns}**")
+                # Features only change on evolve() at the end of a turn: compute once per turn
+                active_features = _get_active_features(st.session_state.plot_generator)
                 # --- REPLACED BLOCK: build aggregated critic feedback context ---
                 if critic_turn > 0 and st.session_state.critic_feedback_window:
                     # Take last N (depth), newest last for readability
-                    recent = st.session_state.critic_feedback_window[-critic_context_depth:]
+                    window = st.session_state.critic_feedback_window
+                    recent = islice(window, max(0, len(window) - critic_context_depth), None)
                     aggregated = "\n\n--- PRIOR CRITIC FEEDBACK ---\n".join(recent)
                 else:
                     aggregated = None
                 if st.session_state.get("last_execution_error"):
                     aggregated = (aggregated or "") + "\n\nLAST_EXECUTION_ERROR:\n" + st.session_state.last_execution_error[:500]
 
-                writer_agent = factory.create_writer(
+                writer_ctx = WriterContext(
                     plot_generator=st.session_state.plot_generator,
                     stock_service=st.session_state.stock_service,
                     user_feedback=st.session_state.get("user_feedback"),
                     critic_feedback=aggregated
                 )
+                # Build the writer once per iteration; later turns only swap its system message
+                if writer_agent is None:
+                    writer_agent = factory.create_writer(writer_ctx)
+                else:
+                    factory.refresh_writer(writer_agent, writer_ctx)
                 # --- END REPLACED BLOCK ---
 
                 col1, col2 = st.columns(2)
                 with col1:
                     # Build writer prompt (concise)
-                    base_writer_prompt = (
-                        f"Generate improved stock YTD code for symbols {', '.join(symbols)}.\n"
-                        f"Requirements:\n- Correct YTD % change from first trading day of year\n"
-                        f"- Save figure as ytd_stock_gains.png\n"
-                        f"- Implement active features & address feedback\n"
-                        f"- Add clear title, legend, labels, grid (if appropriate)\n"
-                        f"- No Streamlit usage\n"
-                    )
+                    base_writer_prompt = _WRITER_PROMPT_PREFIX % _join_features(tuple(symbols))
                     last_error_snippet = None
                     execution_success = False
                     plot_generated = False
                     executable_code = ""
                     for regen_attempt in range(1, max_regen_attempts + 1):
                         attempt_prefix = f"[Regen {regen_attempt}/{max_regen_attempts}] " if regen_attempt > 1 else ""
-                        dynamic_prompt = base_writer_prompt
                         if last_error_snippet:
-                            dynamic_prompt += f"\nPrevious error to fix:\n{last_error_snippet[:600]}\n"
-                            dynamic_prompt += "Ensure indentation & try/except blocks are syntactically correct.\n"
+                            dynamic_prompt = "".join((
+                                base_writer_prompt,
+                                "\nPrevious error to fix:\n", _clip(last_error_snippet, 600), "\n",
+                                _WRITER_FIX_HINT,
+                            ))
+                        else:
+                            dynamic_prompt = base_writer_prompt
                         raw_reply = writer_agent.generate_reply(
                             messages=[{"content": dynamic_prompt, "role": "user"}]
                         )
                         raw_reply = raw_reply if isinstance(raw_reply, str) else str(raw_reply)
-                        executable_code = _extract_python_code(raw_reply)
-                        if not executable_code or "yfinance" not in executable_code:
+                        executable_code = _prepare_executable(raw_reply)
+                        trusted_code = False
+                        if not executable_code:
+                            trusted_code = True  # deterministic template, not LLM output
                             code_gen = CodeGenerator()
-                            executable_code = code_gen.generate_plot_code(
+                            executable_code = _inject_style_fallback(code_gen.generate_plot_code(
                                 symbols,
                                 st.session_state.plot_generator,
                                 st.session_state.stock_service
-                            )
-                        executable_code = _inject_style_fallback(executable_code)
-                        coding_dir = Path("coding"); coding_dir.mkdir(exist_ok=True)
+                            ))
+                        coding_dir = st.session_state.coding_dir
+                        _flush_artifacts()  # pending saves may still be copying the previous plot
                         code_file = coding_dir / "plot_script.py"
-                        with open(code_file, "w", encoding="utf-8") as f:
-                            f.write(executable_code)
-                        import subprocess, time
+                        code_bytes = executable_code.encode("utf-8")
+                        code_hash = hashlib.blake2b(code_bytes, digest_size=16).digest()
+                        if st.session_state.get("last_code_hash") != code_hash or not code_file.exists():
+                            _write_bytes_fast(code_file, code_bytes)
+                            st.session_state.last_code_hash = code_hash
                         start_ts = time.time()
+                        # Template code saves to coding/ytd_stock_gains.png relative to the app root,
+                        # so it runs from there; writer code saves next to itself inside coding/
                         result = subprocess.run(
-                            ["python", "plot_script.py"],  # run inside coding dir
-                            capture_output=True,
-                            text=True,
-                            cwd=str(coding_dir)  # ensure output saved under coding/
+                            [sys.executable, str(code_file)] if trusted_code else _PLOT_RUN_CMD,
+                            capture_output=True,  # raw bytes; only the displayed head is decoded
+                            cwd=str(coding_dir.parent) if trusted_code else str(coding_dir),
+                            env=_PLOT_RUN_ENV
                         )
                         duration = time.time() - start_ts
                         execution_success = result.returncode == 0
@@ -465,14 +907,15 @@ def main():
                             st.success(f"{attempt_prefix}✓ Code executed successfully ({duration:.2f}s)")
                             if result.stdout:
                                 with st.expander(f"{attempt_prefix}Execution Output"):
-                                    st.text(result.stdout[:3000])
+                                    st.text(_decode_head(result.stdout, 3000))
                             st.success(f"{attempt_prefix}Plot v{_display_version(st.session_state.plot_generator.version)} generated")
-                            st.image(str(plot_path_candidate))
+                            _show_image(plot_path_candidate)
                             plot_file = str(plot_path_candidate)
+                            _mark_file(plot_file)
                             st.session_state.last_execution_error = None
                             break
                         else:
-                            err_msg = result.stderr or "Unknown error"
+                            err_msg = _decode_head(result.stderr, 4000) or "Unknown error"
                             last_error_snippet = err_msg.strip()
                             st.session_state.last_execution_error = last_error_snippet  # <--- store persisted error
                             st.error(f"{attempt_prefix}Execution failed ({duration:.2f}s, rc={result.returncode})")
@@ -489,25 +932,22 @@ def main():
                     # Get critic feedback based on code and execution
                     with st.spinner("Getting critic feedback..."):
                         # Prepare context for critic
-                        active_features = _get_active_features(st.session_state.plot_generator)  # CHANGED
-                        
-                        critic_context = f"""
-Evaluate implementation (turn {critic_turn + 1}):
-Symbols: {', '.join(symbols)}
-Version: v{st.session_state.plot_generator.version}
-Active features: {', '.join(active_features) if active_features else 'basic'}
-Execution success: {execution_success}
-Regen attempts used: {regen_attempt if 'regen_attempt' in locals() else 1}/{max_regen_attempts}
-Plot file: {'FOUND' if plot_generated else 'MISSING'}
-Last error (if any): {(last_error_snippet[:400] if last_error_snippet else '<none>')}
-Recent user feedback: {st.session_state.get('user_feedback','<none>')[:400]}
-Previous critic feedback: {st.session_state.get('last_critic_feedback','<none>')[:400] if critic_turn>0 else '<none>'}
-Code (truncated):
-{executable_code[:900]}
-Stdout/Err (truncated):
-{(result.stdout if execution_success else (result.stderr or '') )[:600]}
-Provide concise improvement feedback. If fully satisfactory, include 'APPROVED'.
-"""
+                        critic_context = _CRITIC_CONTEXT_TPL % {
+                            "turn": critic_turn + 1,
+                            "symbols": _join_features(tuple(symbols)),
+                            "version": st.session_state.plot_generator.version,
+                            "features": _join_features(active_features) if active_features else 'basic',
+                            "success": execution_success,
+                            "attempts": regen_attempt if 'regen_attempt' in locals() else 1,
+                            "max_attempts": max_regen_attempts,
+                            "plot_file": 'FOUND' if plot_generated else 'MISSING',
+                            "last_error": _clip(last_error_snippet, 400) if last_error_snippet else '<none>',
+                            "user_feedback": _clip(st.session_state.get('user_feedback', '<none>'), 400),
+                            "prev_critic": (_clip(st.session_state.get('last_critic_feedback', '<none>'), 400)
+                                            if critic_turn > 0 else '<none>'),
+                            "code": _clip(executable_code, 900),
+                            "output": _decode_head(result.stdout if execution_success else result.stderr, 600),
+                        }
                         critic_result = critic_agent.generate_reply(
                             messages=[{"content": critic_context, "role": "user"}]
                         )
@@ -516,14 +956,12 @@ Provide concise improvement feedback. If fully satisfactory, include 'APPROVED'.
                         st.session_state.last_critic_feedback = critic_feedback
 
                         # --- NEW: maintain rolling window ---
-                        st.session_state.critic_feedback_window.append(critic_feedback)
-                        # Hard cap window size (store up to 20 for memory safety)
-                        if len(st.session_state.critic_feedback_window) > 20:
-                            st.session_state.critic_feedback_window = st.session_state.critic_feedback_window[-20:]
+                        st.session_state.critic_feedback_window.append(critic_feedback)  # deque evicts beyond 20
                         # --- END NEW ---
 
                         st.session_state.evaluator.store_feedback(critic_feedback, "critic", critic_turn)
-                        critic_feedback_history.append(critic_feedback)
+                        critic_feedback_history[n_critic_feedback] = critic_feedback
+                        n_critic_feedback += 1
                         
                         # Evaluate feedback
                         quality_score = st.session_state.evaluator.score_quality(critic_feedback)
@@ -535,21 +973,17 @@ Provide concise improvement feedback. If fully satisfactory, include 'APPROVED'.
                         # --- NEW: LLM secondary evaluation (L2) ---
                         if enable_llm_eval:
                             try:
-                                from agent_factory import AgentFactory as _AF
-                                llm_eval_agent = _AF.create_llm_evaluator()
+                                if llm_eval_agent is None:
+                                    llm_eval_agent = AgentFactory.create_llm_evaluator()
                                 criteria_str = ", ".join(llm_eval_criteria) if llm_eval_criteria else "overall"
-                                eval_prompt = f"""
-Provide JSON evaluation (0-1 floats) for criteria: {criteria_str}.
-Context:
-Execution success: {execution_success}
-Plot generated: {bool(plot_file)}
-Critic feedback: {critic_feedback[:600]}
-Selected features: {', '.join(active_features) if active_features else 'basic'}
-Code snippet:
-{executable_code[:800]}
-If execution failed, penalize accuracy & overall.
-Return ONLY JSON.
-"""
+                                eval_prompt = _EVAL_PROMPT_TPL % {
+                                    "criteria": criteria_str,
+                                    "success": execution_success,
+                                    "plot": bool(plot_file),
+                                    "critic_feedback": _clip(critic_feedback, 600),
+                                    "features": _join_features(active_features) if active_features else 'basic',
+                                    "code": _clip(executable_code, 800),
+                                }
                                 llm_eval_raw = llm_eval_agent.generate_reply(
                                     messages=[{"content": eval_prompt, "role": "user"}]
                                 )
@@ -561,6 +995,7 @@ Return ONLY JSON.
                                     "raw": llm_eval_raw
                                 })
                                 if llm_eval_parsed:
+                                    _append_llm_eval_row(critic_turn + 1, llm_eval_parsed)
                                     with st.expander(f"🔎 LLM Eval (Turn {critic_turn + 1})", expanded=False):
                                         st.json(llm_eval_parsed)
                                 else:
@@ -570,7 +1005,7 @@ Return ONLY JSON.
                         # --- END NEW ---
 
                         st.session_state.total_iterations += 1
-                        st.session_state.artifacts_manager.save_iteration(
+                        _queue_save_iteration(
                             iteration=st.session_state.total_iterations,
                             iteration_type="critic",
                             plot_generator=st.session_state.plot_generator,
@@ -582,8 +1017,14 @@ Return ONLY JSON.
                         
                         if is_approved and quality_score >= critic_threshold:
                             st.session_state.last_critic_turns_used = critic_turn + 1
+                            stop_reason = "approved"
                             st.success(f"✅ Approved after {critic_turn + 1} turn(s) v{_display_version(st.session_state.plot_generator.version)}")
                             break
+                        elif plateau.update(quality_score):
+                            st.session_state.last_critic_turns_used = critic_turn + 1
+                            stop_reason = "plateau"
+                            st.info(f"⏹️ Early stop: score plateaued at {plateau.best:.2f} (turn {critic_turn + 1}/{max_critic_turns})")
+                            break
                         else:
                             st.session_state.plot_generator.evolve(critic_feedback, "critic")
                             st.session_state.stock_service.evolve(critic_feedback)
@@ -592,6 +1033,11 @@ Return ONLY JSON.
         else:
             # Mock mode - no Azure required
             for critic_turn in range(max_critic_turns):
+                if critic_turn >= len(_MOCK_CRITIC_FEEDBACK):
+                    # every distinct mock critique was given; later turns would only repeat the last one
+                    st.info("No new critic feedback; stopping.")
+                    stop_reason = "exhausted"
+                    break
                 st.write(f"**Critic Turn {critic_turn + 1}/{max_critic_turns}**")
                 
                 col1, col2 = st.columns(2)
@@ -599,33 +1045,37 @@ Return ONLY JSON.
                 with col1:
                     # Generate plot directly using plot generator
                     try:
-                        plot_file = st.session_state.plot_generator.plot_stock_prices(
-                            stock_data,
-                            "coding/ytd_stock_gains.png"
-                        )
-                        st.success(
-                            f"Plot {_display_version(st.session_state.plot_generator.version)} "
-                            f"generated: {os.path.basename(plot_file)}"
-                        )
+                        fig = None if save_png else st.session_state.plot_generator.render_plotly(stock_data)
+                        if fig is not None:
+                            # client-side chart: no matplotlib render, no PNG on disk
+                            plot_file = None
+                            st.session_state.current_figure = fig
+                            st.plotly_chart(fig, use_container_width=True)
+                            st.success(f"Plot {_display_version(st.session_state.plot_generator.version)} rendered (interactive)")
+                        else:
+                            plot_file = st.session_state.plot_generator.plot_stock_prices(
+                                stock_data,
+                                "coding/ytd_stock_gains.png"
+                            )
+                            _mark_file(plot_file)
+                            st.success(
+                                f"Plot {_display_version(st.session_state.plot_generator.version)} "
+                                f"generated: {os.path.basename(plot_file)}"
+                            )
                     except Exception as e:
                         st.error(f"Error generating plot: {e}")
                         continue
                 
                 with col2:
                     # Mock critic feedback based on version
-                    feedback_templates = [
-                        "The plot needs moving averages for better trend visibility. Add 20-day and 50-day MA.",
-                        "Good progress! Now add volume analysis in a subplot below the main chart.",
-                        "Excellent! The plot is clear and informative. APPROVED"
-                    ]
-                    
-                    critic_feedback = feedback_templates[min(critic_turn, len(feedback_templates)-1)]
+                    critic_feedback = _MOCK_CRITIC_FEEDBACK[critic_turn]
                     
                     # Store and evaluate feedback
                     st.session_state.evaluator.store_feedback(
                         critic_feedback, "critic", critic_turn
                     )
-                    critic_feedback_history.append(critic_feedback)
+                    critic_feedback_history[n_critic_feedback] = critic_feedback
+                    n_critic_feedback += 1
                     
                     quality_score = st.session_state.evaluator.score_quality(critic_feedback)
                     is_approved = st.session_state.evaluator.is_approved(critic_feedback)
@@ -635,7 +1085,7 @@ Return ONLY JSON.
                     
                     # Save artifacts for this iteration
                     st.session_state.total_iterations += 1
-                    artifacts = st.session_state.artifacts_manager.save_iteration(
+                    _queue_save_iteration(
                         iteration=st.session_state.total_iterations,
                         iteration_type="critic",
                         plot_generator=st.session_state.plot_generator,
@@ -651,12 +1101,18 @@ Return ONLY JSON.
                     
                     if meets_criteria:
                         st.session_state.last_critic_turns_used = critic_turn + 1
+                        stop_reason = "approved"
                         st.success(
                             f"✅ Plot approved by critic after {critic_turn + 1} turn(s). "
                             f"Version: v{_display_version(st.session_state.plot_generator.version)} "
                             f"(Score: {quality_score:.2f} ≥ {critic_threshold})"
                         )
                         break
+                    elif plateau.update(quality_score):
+                        st.session_state.last_critic_turns_used = critic_turn + 1
+                        stop_reason = "plateau"
+                        st.info(f"⏹️ Early stop: score plateaued at {plateau.best:.2f} (turn {critic_turn + 1}/{max_critic_turns})")
+                        break
                     else:
                         # Show why it wasn't approved
                         if is_approved and quality_score < critic_threshold:
@@ -676,18 +1132,31 @@ Return ONLY JSON.
                             f"(critic turns used: {turns_used}/{max_critic_turns})"
                         )
         
+        st.session_state.last_critic_stop_reason = stop_reason
+        _lazy_state("artifact_writer", AsyncArtifactWriter).submit(
+            st.session_state.artifacts_manager.record_critic_stop,
+            outer_iteration=st.session_state.outer_iteration,
+            reason=stop_reason,
+            turns_used=st.session_state.last_critic_turns_used
+        )
+        _flush_artifacts()
+
         # Display final plot from critic loop
         # Use the actual filename returned by plot_stock_prices
-        if 'plot_file' in locals() and _safe_exists(plot_file):  # CHANGED
+        if 'plot_file' in locals() and _fast_exists(plot_file):  # CHANGED
             st.session_state.current_plot_file = plot_file
             st.subheader("📈 Current Plot Version")
-            st.image(plot_file, caption=f"Version v{_display_version(st.session_state.plot_generator.version)}")
+            _show_image(plot_file, caption=f"Version v{_display_version(st.session_state.plot_generator.version)}")
+        elif not save_png and st.session_state.get("current_figure") is not None:
+            st.session_state.current_plot_file = None
+            st.subheader("📈 Current Plot Version")
+            st.plotly_chart(st.session_state.current_figure, use_container_width=True)
         elif st.session_state.plot_generator.plot_history:
             latest_plot = st.session_state.plot_generator.plot_history[-1]['filename']
-            if _safe_exists(latest_plot):  # CHANGED
+            if _fast_exists(latest_plot):  # CHANGED
                 st.session_state.current_plot_file = latest_plot
                 st.subheader("📈 Current Plot Version")
-                st.image(latest_plot, caption=f"Version v{_display_version(st.session_state.plot_generator.version)}")
+                _show_image(latest_plot, caption=f"Version v{_display_version(st.session_state.plot_generator.version)}")
         
         # Display critic feedback summary
         with st.expander("📝 Critic Feedback Summary"):
@@ -710,18 +1179,11 @@ Return ONLY JSON.
                         st.json(latest_eval)
                 if len(st.session_state.llm_eval_results) > 1:
                     with st.expander("LLM Eval History (parsed)"):
-                        history = [
-                            {
-                                "turn": r["turn"],
-                                **{k: v for k, v in r["parsed"].items() if isinstance(v,(int,float))}
-                            }
-                            for r in st.session_state.llm_eval_results if r["parsed"]
-                        ]
-                        st.dataframe(history)
+                        st.dataframe(st.session_state.llm_eval_df)
             # --- END NEW ---
             # Show improvement plan
-            if critic_feedback_history:
-                plan = st.session_state.evaluator.generate_improvement_plan(critic_feedback_history)
+            if n_critic_feedback:
+                plan = st.session_state.evaluator.generate_improvement_plan(critic_feedback_history[:n_critic_feedback])
                 # --- replaced block: structured + normalized output ---
                 st.markdown("### 🔍 Structured Improvement Plan")
                 for priority, items in plan.items():
@@ -742,180 +1204,26 @@ Return ONLY JSON.
                     st.json(plan)
     # --- Persistent User Feedback Section (shown after at least one iteration) ---
     if st.session_state.outer_iteration > 0:
-        st.subheader("👤 User Feedback")
-        # Radio persists independently of button state
-        user_satisfied = st.radio(
-            "Are you satisfied with the current plot?",
-            ["Yes, looks great!", "No, needs improvement", "Getting better, but not there yet"],
-            key=f"satisfaction_{st.session_state.outer_iteration}",
-            index=0
-        )
-
-        current_plot_file = st.session_state.get("current_plot_file")
-        stock_data = st.session_state.get("stock_data")
-
-        if current_plot_file and os.path.exists(current_plot_file):
-            st.image(current_plot_file, caption=f"Current Plot (v{_display_version(st.session_state.plot_generator.version)})")
-
-        if user_satisfied == "Yes, looks great!":
-            st.success("🎉 Great! The plot evolution is complete!")
-            # Generate evolution report
-            report = st.session_state.artifacts_manager.generate_evolution_report()
-            
-            # Final summary
-            with st.expander("📊 Final Evolution Summary"):
-                summary = st.session_state.plot_generator.get_evolution_summary()
-                st.json(summary)
-                
-                # Show evolution report
-                st.markdown("### 📝 Evolution Report")
-                st.markdown(report)
-                
-                # Show saved artifacts location
-                if st.session_state.artifacts_manager.current_case_dir:
-                    st.info(f"📁 Artifacts saved to: {st.session_state.artifacts_manager.current_case_dir}")
-        else:
-            st.info("Let's improve the plot based on your feedback!")
-            simple_feedback = st.text_area(
-                "Describe what needs improvement:",
-                placeholder="e.g., Add volume data; use clearer colors; include moving averages",
-                key=f"simple_feedback_{st.session_state.outer_iteration}",
-                height=100
-            )
-            with st.expander("📋 Advanced Feedback Options", expanded=False):
-                feedback_type = st.radio(
-                    "Choose feedback method:",
-                    ["Quick Text", "Guided Questions", "Checkboxes", "Combined"],
-                    key=f"feedback_type_{st.session_state.outer_iteration}"
-                )
-                user_feedback_parts = []
-                if feedback_type in ["Guided Questions", "Combined"]:
-                    st.write("**🎯 Answer these questions:**")
-                    q1 = st.text_input("1. First impression?", key=f"q1_{st.session_state.outer_iteration}")
-                    if q1: user_feedback_parts.append(f"First impression: {q1}")
-                    q2 = st.text_input("2. Missing data?", key=f"q2_{st.session_state.outer_iteration}")
-                    if q2: user_feedback_parts.append(f"Missing: {q2}")
-                    q3 = st.text_input("3. Visual improvements?", key=f"q3_{st.session_state.outer_iteration}")
-                    if q3: user_feedback_parts.append(f"Visual: {q3}")
-                if feedback_type in ["Checkboxes", "Combined"]:
-                    st.write("**☑️ Quick selections:**")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.checkbox("Add Moving Averages", key=f"cb_ma_{st.session_state.outer_iteration}"):
-                            user_feedback_parts.append("Add moving averages")
-                        if st.checkbox("Add Volume", key=f"cb_vol_{st.session_state.outer_iteration}"):
-                            user_feedback_parts.append("Add volume subplot")
-                        if st.checkbox("Add Annotations", key=f"cb_ann_{st.session_state.outer_iteration}"):
-                            user_feedback_parts.append("Add price annotations")
-                    with col2:
-                        if st.checkbox("Better Colors", key=f"cb_col_{st.session_state.outer_iteration}"):
-                            user_feedback_parts.append("Improve colors")
-                        if st.checkbox("Improve Labels", key=f"cb_lab_{st.session_state.outer_iteration}"):
-                            user_feedback_parts.append("Better labels")
-                        if st.checkbox("Add Grid", key=f"cb_grid_{st.session_state.outer_iteration}"):
-
-                            user_feedback_parts.append("Enhance grid")
-
-            priority = st.select_slider(
-                "How important are these changes?",
-                options=["Nice to have", "Important", "Critical"],
-                value="Important",
-                key=f"priority_{st.session_state.outer_iteration}"
-            )
-
-            if st.button("📤 Submit Feedback", type="primary", key=f"submit_{st.session_state.outer_iteration}"):
-                if not (simple_feedback or user_feedback_parts):
-                    st.warning("⚠️ Please provide some feedback before submitting")
-                else:
-                    final_feedback = f"[Priority: {priority}]\n\n"
-                    if simple_feedback:
-                        final_feedback += f"User request: {simple_feedback}\n\n"
-                    if user_feedback_parts:
-                        final_feedback += "Additional details:\n" + "\n".join(f"• {p}" for p in user_feedback_parts)
-                    st.session_state.user_feedback = final_feedback
-                    st.session_state.evaluator.store_feedback(final_feedback, "user", st.session_state.outer_iteration)
-                    st.session_state.plot_generator.evolve(final_feedback, "user")
-                    st.session_state.stock_service.evolve(final_feedback)
-                    st.session_state.total_iterations += 1
-                    current_plot_for_artifacts = current_plot_file
-                    if not current_plot_for_artifacts and st.session_state.plot_generator.plot_history:
-                        current_plot_for_artifacts = st.session_state.plot_generator.plot_history[-1]['filename']
-                    if stock_data is not None:
-                        st.session_state.artifacts_manager.save_iteration(
-                            iteration=st.session_state.total_iterations,
-                            iteration_type="user",
-                            plot_generator=st.session_state.plot_generator,
-                            stock_service=st.session_state.stock_service,
-                            feedback=final_feedback,
-                            plot_path=current_plot_for_artifacts,
-                            stock_data=stock_data
-                        )
-                    st.success(f"✅ Feedback received! Services evolved to v{st.session_state.plot_generator.version}")
-                    with st.expander("📋 Feedback Processed", expanded=True):
-                        st.text(final_feedback)
-                    st.info("👉 Click 'Start Analysis' again to run the next evolution cycle.")
-                    st.session_state.plot_generator.save_state("coding/plot_state.json")
-
-                    # --- NEW: Critic evaluation after user feedback (non-mock mode) ---
-                    if not mock_mode:
-                        try:
-                            from agent_factory import AgentFactory
-                            factory = AgentFactory()
-                            post_critic = factory.create_critic()
-                            active_features = _get_active_features(st.session_state.plot_generator)  # CHANGED
-                            post_context = f"""
-Evaluate newly applied USER feedback changes.
-
-Version: v{st.session_state.plot_generator.version}
-Active features now: {', '.join(active_features) if active_features else 'basic'}
-User feedback just applied:
-{final_feedback[:1200]}
-
-Assess:
-1. Does feedback align with prior critic guidance?
-2. Any missing high-impact enhancements?
-3. Next concrete step (one sentence) unless complete.
-
-If no further improvements strongly needed, include token: USER_FEEDBACK_OK
-Provide concise response."""
-                            post_reply = post_critic.generate_reply(
-                                messages=[{"content": post_context, "role": "user"}]
-                            )
-                            post_reply_text = post_reply if isinstance(post_reply, str) else str(post_reply)
-                            st.session_state.last_critic_feedback = post_reply_text
-                            st.session_state.evaluator.store_feedback(
-                                post_reply_text, "critic_post_user", st.session_state.outer_iteration
-                            )
-                            # Save as its own iteration artifact
-                            st.session_state.total_iterations += 1
-                            st.session_state.artifacts_manager.save_iteration(
-                                iteration=st.session_state.total_iterations,
-                                iteration_type="critic_post_user",
-                                plot_generator=st.session_state.plot_generator,
-                                stock_service=st.session_state.stock_service,
-                                feedback=post_reply_text,
-                                plot_path=current_plot_for_artifacts,
-                                stock_data=stock_data
-                            )
-                            with st.expander("🤖 Critic Evaluation Of User Feedback", expanded=True):
-                                st.write(post_reply_text)
-                        except Exception as e:
-                            st.warning(f"Post-feedback critic evaluation failed: {e}")
-                    # --- END NEW ---
+        _user_feedback_section(mock_mode, save_png)
     # Option to view all plot versions
-    if st.session_state.plot_generator.version > 1:
+    pg = st.session_state.get("plot_generator")
+    if pg is not None and pg.version > 1:
         with st.expander("🖼️ View All Plot Versions"):
             cols = st.columns(3)
-            for idx, entry in enumerate(st.session_state.plot_generator.plot_history[-6:]):
+            # instances created before recent_plots existed (kept across reloads) fall back to a slice
+            recent = getattr(pg, "recent_plots", None)
+            dv = _display_version  # local binding for the per-entry call
+            for idx, entry in enumerate(recent if recent is not None else pg.plot_history[-6:]):
                 with cols[idx % 3]:
-                    if os.path.exists(entry['filename']):
+                    if _fast_exists(entry['filename']):
                         # Display mapped version
-                        display_v = _display_version(entry['version'])
-                        st.image(entry['filename'],
-                                 caption=f"Version v{display_v}: {os.path.basename(entry['filename'])}")
+                        display_v = dv(entry['version'])
+                        _show_image(entry['filename'], thumbnail=True,
+                                    caption=f"Version v{display_v}: {os.path.basename(entry['filename'])}")
 
             # Add download artifacts button
             if st.session_state.artifacts_manager.current_case_dir:
+                _flush_artifacts()
                 st.download_button(
                     label="📥 Download Evolution Report",
                     data=st.session_state.artifacts_manager.generate_evolution_report(),
@@ -1,27 +1,281 @@
 import os
+import errno
 import json
-import shutil
+import hashlib
+import io
+import queue
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 import pandas as pd
 import re
+from feature_access import get_capability_dict, get_feature_dict
+try:
+    import orjson  # optional: faster artifact JSON writes
+except ImportError:
+    orjson = None
+try:
+    import zstandard  # optional: compress archived JSON snapshots
+except ImportError:
+    zstandard = None
+
+# Date stamp (YYYYMMDD) already present in a case name
+_DATE_RE = re.compile(r"\d{8}")
+
+# Kernel copy not possible for this fd pair/filesystem: try the next strategy
+_COPY_FALLBACK_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EBADF}
+
+def _copy_fd_kernel(in_fd: int, out_fd: int, size: int) -> bool:
+    """Copy size bytes in-kernel (copy_file_range, then sendfile); False if neither is usable."""
+    copy_range = getattr(os, "copy_file_range", None)
+    if copy_range is not None:
+        try:
+            copied = 0
+            while copied < size:
+                n = copy_range(in_fd, out_fd, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return True
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+            os.lseek(in_fd, 0, os.SEEK_SET)
+            os.lseek(out_fd, 0, os.SEEK_SET)
+            os.ftruncate(out_fd, 0)
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None:
+        try:
+            offset = 0
+            while offset < size:
+                n = sendfile(out_fd, in_fd, offset, min(size - offset, 1 << 30))
+                if n == 0:
+                    break
+                offset += n
+            return True
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+            os.lseek(out_fd, 0, os.SEEK_SET)
+            os.ftruncate(out_fd, 0)
+    return False
+
+def _fastcopy(src, dst, mv: memoryview):
+    """copy2 replacement: in-kernel copy when available, else a readinto loop through mv; keeps mtime."""
+    st = os.stat(src)
+    in_fd = os.open(src, os.O_RDONLY)
+    try:
+        out_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if not _copy_fd_kernel(in_fd, out_fd, st.st_size):
+                with open(in_fd, "rb", buffering=0, closefd=False) as f:
+                    while n := f.readinto(mv):
+                        view = mv[:n]
+                        while view:
+                            view = view[os.write(out_fd, view):]
+        finally:
+            os.close(out_fd)
+    finally:
+        os.close(in_fd)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def _file_digest(path, mv: memoryview) -> bytes:
+    """blake2b-128 of a file, streamed through the caller's buffer."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(mv):
+            h.update(mv[:n])
+    return h.digest()
+
+def _json_bytes(obj: Any, default=None) -> bytes:
+    """Serialize obj to indented JSON bytes; uses orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:  # orjson.JSONEncodeError; retry with the more permissive stdlib encoder
+            pass
+    return json.dumps(obj, indent=2, default=default).encode("utf-8")
+
+def _dump_json(obj: Any, filepath, default=None, compress: bool = False):
+    """Write obj as indented JSON (zstd-compressed when compress is set)."""
+    data = _json_bytes(obj, default=default)
+    if compress:
+        data = zstandard.ZstdCompressor(level=3).compress(data)
+    with open(filepath, "wb") as f:
+        f.write(data)
+
+def _load_json(filepath) -> Any:
+    """Read a JSON file (.zst files are decompressed); parses with orjson when installed."""
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if str(filepath).endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {filepath}")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _write_atomic(path: Path, data: bytes):
+    """Single write + fsync to a temp file, then os.replace (readers never see a partial file)."""
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+
+class AsyncArtifactWriter:
+    """Run artifact writes on one daemon thread (FIFO) so the UI thread does not block on disk I/O"""
+    
+    def __init__(self, maxsize: int = 64):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.errors: List[str] = []
+        # newest pending job per coalescing key (see submit_coalesced)
+        self._latest: Dict[Any, tuple] = {}
+        self._latest_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(f"{getattr(fn, '__name__', fn)}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); blocks only when the queue is full."""
+        self._queue.put((fn, args, kwargs))
+    
+    def submit_coalesced(self, key, fn, *args, **kwargs):
+        """Like submit, but a still-pending job with the same key is replaced: only the newest one runs."""
+        with self._latest_lock:
+            pending = key in self._latest
+            self._latest[key] = (fn, args, kwargs)
+        if not pending:
+            self._queue.put((self._run_latest, (key,), {}))
+    
+    def _run_latest(self, key):
+        with self._latest_lock:
+            fn, args, kwargs = self._latest.pop(key)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            self.errors.append(f"{getattr(fn, '__name__', fn)}: {e}")
+    
+    def flush(self) -> List[str]:
+        """Block until queued writes finish; return (and clear) errors raised meanwhile."""
+        self._queue.join()
+        errors, self.errors = self.errors, []
+        return errors
+
+_IO_POOL: Optional[ThreadPoolExecutor] = None
+
+def _io_pool() -> ThreadPoolExecutor:
+    """Shared pool for the independent per-iteration artifact writes (created on first use)."""
+    global _IO_POOL
+    if _IO_POOL is None:
+        _IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="artifact-io")
+        atexit.register(_IO_POOL.shutdown, wait=True)
+    return _IO_POOL
+
+def _artifact_job(name: str, dest: Path, fn, args: tuple) -> tuple:
+    """Run one artifact write on the pool; returns the (name, path) entry for saved_artifacts."""
+    fn(*args)
+    return name, str(dest)
+
+# Columns of the in-memory iteration table (struct-of-arrays; *_md hold pre-rendered report lines)
+_ITER_COLUMNS = ("iteration", "type", "timestamp", "plot_version", "service_version",
+                 "artifacts_md", "plot_features_md", "service_features_md")
+
+_ITER_REPORT_TPL = """
+### Iteration {} ({})
+- **Timestamp**: {}
+- **Plot Version**: v{}
+- **Service Version**: v{}
+- **Artifacts**:
+{}{}{}"""
+
+# Capability blocks spliced into StockServiceV* snapshots: ((capability names), snippet)
+_SERVICE_SYMBOL_SNIPPETS = (
+    (("moving_averages", "moving_avg"), '''
+            # Moving averages
+            df['MA20'] = df['Close'].rolling(window=20).mean()
+            df['MA50'] = df['Close'].rolling(window=50).mean()
+'''),
+    (("rsi",), '''
+            # RSI calculation
+            delta = df['Close'].diff()
+            gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+            loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+            rs = gain / loss.replace(0, np.nan)
+            df['RSI'] = 100 - (100 / (1 + rs))
+'''),
+)
+
+_SERVICE_LOOP_END = '''
+            data[symbol] = df
+'''
+
+_SERVICE_CLOSE_MAT = '''
+        # Cross-symbol features work on one stacked (dates x symbols) close matrix
+        close_mat = pd.DataFrame({s: df['Close'] for s, df in data.items() if not df.empty})
+'''
+
+_SERVICE_CROSS_SNIPPETS = (
+    (("volatility",), '''
+        # Volatility: one rolling kernel for all symbols
+        if not close_mat.empty:
+            vol = close_mat.pct_change(fill_method=None).rolling(window=20).std() * np.sqrt(252)
+            for s in close_mat.columns:
+                data[s]['Volatility'] = vol[s].reindex(data[s].index)
+'''),
+    (("correlation",), '''
+        # Correlation: a single DataFrame.corr() over all pairs; each frame keeps only its own row
+        if close_mat.shape[1] > 1:
+            corr_mat = close_mat.pct_change(fill_method=None).corr()
+            for s in close_mat.columns:
+                data[s].attrs['correlation'] = corr_mat[s].drop(s).to_dict()
+'''),
+)
+
+_SERVICE_RETURN = '''
+        return data
+'''
 
 class ArtifactsManager:
     """Manage artifacts and code evolution history"""
     
-    def __init__(self, base_dir: str = "artifacts"):
+    def __init__(self, base_dir: str = "artifacts", compress: bool = False):
         self.base_dir = Path(base_dir)
+        # opt-in: data/ snapshots are written as .json.zst (needs zstandard)
+        self.compress = compress and zstandard is not None
         self.base_dir.mkdir(exist_ok=True)
         self.current_case_dir = None
         self.case_name = None
         self.metadata = {}
+        # content digest -> first file written with it (unchanged artifacts are hard-linked)
+        self._hash_index: Dict[bytes, Path] = {}
+        self._last_meta_bytes = b""  # last metadata.json payload flushed (skip identical rewrites)
+        # 1 MiB scratch for plot hashing/copy fallback, reused across iterations; per manager because
+        # managers share the I/O pool, while one manager's saves run one at a time on its writer
+        self._copy_mv = memoryview(bytearray(1 << 20))
+        self._cols: Dict[str, list] = {c: [] for c in _ITER_COLUMNS}
         
     def create_case(self, case_name: str, symbols: List[str]) -> Path:
         """Create a new case folder with timestamp"""
         # Clean the case name to avoid date duplication
-        # Check if case_name already contains a date pattern (YYYYMMDD)
-        date_pattern = r'\d{8}'
         
         # Get current date and time components
         now = datetime.now()
@@ -29,7 +283,7 @@ class ArtifactsManager:
         time_str = now.strftime("%H%M%S")
         
         # Check if the case name already contains today's date
-        if re.search(date_pattern, case_name):
+        if _DATE_RE.search(case_name):
             # If it already has a date, just add the time
             self.case_name = f"{case_name}_{time_str}"
         else:
@@ -38,6 +292,9 @@ class ArtifactsManager:
         
         self.current_case_dir = self.base_dir / self.case_name
         self.current_case_dir.mkdir(parents=True, exist_ok=True)
+        self._hash_index = {}
+        self._last_meta_bytes = b""
+        self._cols = {c: [] for c in _ITER_COLUMNS}
         
         # Initialize metadata
         self.metadata = {
@@ -71,231 +328,306 @@ class ArtifactsManager:
             raise ValueError("No active case. Call create_case first.")
         
         iteration_id = f"v{iteration:03d}_{iteration_type}"
-        saved_artifacts = {}
+        now_iso = datetime.now().isoformat()  # one timestamp shared by every artifact of this iteration
+        json_ext = ".json.zst" if self.compress else ".json"
+        # artifact name -> (destination, writer, args); each job touches only its own file
+        jobs = {}
         
         # Save plot if exists
         if plot_path and os.path.exists(plot_path):
             plot_dest = self.current_case_dir / "plots" / f"{iteration_id}_plot.png"
-            shutil.copy2(plot_path, plot_dest)
-            saved_artifacts["plot"] = str(plot_dest)
+            jobs["plot"] = (plot_dest, self._copy_deduped, (plot_path, plot_dest))
+        
+        # Feature snapshots, filtered once and shared by the code snapshot, metadata and report
+        plot_features = self._get_plot_features(plot_generator)  # CHANGED
+        service_caps = get_capability_dict(stock_service)  # CHANGED
+        active_plot = {k: v for k, v in plot_features.items() if v and v != "default"}
+        active_service = [k for k, v in service_caps.items() if v]
         
         # Save generated code (plot_generator state)
         code_file = self.current_case_dir / "code" / f"{iteration_id}_plot_generator.py"
-        self._save_plot_generator_code(plot_generator, code_file)
-        saved_artifacts["plot_generator_code"] = str(code_file)
+        jobs["plot_generator_code"] = (code_file, self._save_plot_generator_code,
+                                       (plot_generator, code_file, plot_features, active_plot))
         
         # Save stock service state
         service_file = self.current_case_dir / "code" / f"{iteration_id}_stock_service.py"
-        self._save_stock_service_code(stock_service, service_file)
-        saved_artifacts["stock_service_code"] = str(service_file)
+        jobs["stock_service_code"] = (service_file, self._save_stock_service_code,
+                                      (stock_service, service_file, now_iso))
         
         # Save feedback
         if feedback:
             feedback_file = self.current_case_dir / "feedback" / f"{iteration_id}_feedback.txt"
-            feedback_file.write_text(feedback, encoding='utf-8')
-            saved_artifacts["feedback"] = str(feedback_file)
+            jobs["feedback"] = (feedback_file, feedback_file.write_text, (feedback, 'utf-8'))
         
         # Save data snapshot
         if stock_data:
-            data_file = self.current_case_dir / "data" / f"{iteration_id}_data.json"
-            self._save_stock_data(stock_data, data_file)
-            saved_artifacts["data"] = str(data_file)
+            data_file = self.current_case_dir / "data" / f"{iteration_id}_data{json_ext}"
+            jobs["data"] = (data_file, self._save_stock_data, (stock_data, data_file))
         
-        # Save states
+        # Save states (plain JSON in each class's own format so load_state can read them back)
         plot_state_file = self.current_case_dir / "states" / f"{iteration_id}_plot_state.json"
-        plot_generator.save_state(str(plot_state_file))
-        saved_artifacts["plot_state"] = str(plot_state_file)
+        jobs["plot_state"] = (plot_state_file, _dump_json, (plot_generator.to_dict(), plot_state_file))
         
         service_state_file = self.current_case_dir / "states" / f"{iteration_id}_service_state.json"
-        stock_service.save_state(str(service_state_file))
-        saved_artifacts["service_state"] = str(service_state_file)
+        jobs["service_state"] = (service_state_file, _dump_json, (stock_service.to_dict(), service_state_file))
+        
+        # Issue the writes concurrently; result() re-raises the first failure like the sequential code did
+        pool = _io_pool()
+        futures = [pool.submit(_artifact_job, name, *job) for name, job in jobs.items()]
+        saved_artifacts = dict(future.result() for future in futures)
         
         # Update metadata
-        plot_features = self._get_plot_features(plot_generator)  # CHANGED
-        service_caps = getattr(stock_service, "capabilities",
-                               getattr(stock_service, "features", {}))  # CHANGED
         iteration_info = {
             "iteration": iteration,
             "type": iteration_type,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso,
             "artifacts": saved_artifacts,
             "plot_version": getattr(plot_generator, "version", "?"),
             "service_version": getattr(stock_service, "version", "?"),
             "features": {
                 "plot": plot_features,          # CHANGED
                 "service": service_caps         # CHANGED
-            }
+            },
+            "active_plot_features": list(active_plot),
+            "active_service_features": active_service
         }
         self.metadata["iterations"].append(iteration_info)
+        self._append_iteration_row(iteration_info)
         self._save_metadata()
         
         return saved_artifacts
     
+    def _append_iteration_row(self, info: Dict[str, Any]):
+        """Append one iteration to the columnar table, rendering its report lines once."""
+        cols = self._cols
+        cols["iteration"].append(info["iteration"])
+        cols["type"].append(info["type"])
+        cols["timestamp"].append(info["timestamp"])
+        cols["plot_version"].append(info["plot_version"])
+        cols["service_version"].append(info["service_version"])
+        cols["artifacts_md"].append("".join(
+            f"  - {artifact_type}: `{Path(path).name}`\n" for artifact_type, path in info["artifacts"].items()
+        ))
+        plot_features = info.get("active_plot_features")
+        if plot_features is None:  # metadata written before the lists were stored
+            plot_features = [k for k, v in info["features"]["plot"].items() if v and v != "default"]
+        service_features = info.get("active_service_features")
+        if service_features is None:
+            service_features = [k for k, v in info["features"]["service"].items() if v]
+        cols["plot_features_md"].append(f"- **Plot Features**: {', '.join(plot_features)}\n" if plot_features else "")
+        cols["service_features_md"].append(
+            f"- **Service Capabilities**: {', '.join(service_features)}\n" if service_features else ""
+        )
+    
+    def record_critic_stop(self, outer_iteration: int, reason: str, turns_used: int):
+        """Record why a critic loop ended (approved / plateau / exhausted / max_turns) in case metadata."""
+        if not self.current_case_dir:
+            return
+        self.metadata.setdefault("critic_stops", []).append({
+            "outer_iteration": outer_iteration,
+            "reason": reason,
+            "turns_used": turns_used,
+            "timestamp": datetime.now().isoformat()
+        })
+        self._save_metadata()
+    
+    def _link_existing(self, digest: bytes, dest: Path) -> bool:
+        """Hard-link dest to an earlier artifact with this digest; False if there is none (or linking fails)."""
+        existing = self._hash_index.get(digest)
+        if existing is None or not existing.exists():
+            return False
+        try:
+            if dest.exists():
+                dest.unlink()
+            os.link(existing, dest)
+            return True
+        except OSError:
+            return False  # e.g. filesystem without hard links: caller writes a real copy
+    
+    def _write_deduped(self, dest: Path, data: bytes):
+        """Write data to dest, or hard-link an earlier artifact with exactly the same bytes."""
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if not self._link_existing(digest, dest):
+            dest.write_bytes(data)
+            self._hash_index[digest] = dest
+    
+    def _copy_deduped(self, src, dest: Path):
+        """Copy src to dest (in-kernel where possible), or hard-link an earlier identical artifact."""
+        digest = _file_digest(src, self._copy_mv)
+        if not self._link_existing(digest, dest):
+            _fastcopy(src, dest, self._copy_mv)
+            self._hash_index[digest] = dest
+    
     def _get_plot_features(self, pg) -> dict:
         """Safely return plot feature dict for legacy or new PlotGenerator."""
-        if pg is None:
-            return {}
-        return getattr(pg, "current_features",
-                       getattr(pg, "features", {})) or {}
+        return get_feature_dict(pg)
     
-    def _save_plot_generator_code(self, plot_generator, code_file):
+    def _save_plot_generator_code(self, plot_generator, code_file, features: Optional[dict] = None,
+                                  active_features: Optional[dict] = None):
         """Persist minimal snapshot of plot generator state + code reference."""
         try:
-            features = self._get_plot_features(plot_generator)  # CHANGED
+            if features is None:
+                features = self._get_plot_features(plot_generator)  # CHANGED
+            if active_features is None:
+                active_features = {k: v for k, v in features.items() if v and v != "default"}
             version = getattr(plot_generator, "version", "?")
             out = {
                 "version": version,
-                "active_features": {k: v for k, v in features.items() if v and v != "default"},
+                "active_features": active_features,
                 "all_features": features
             }
-            with open(code_file, "w", encoding="utf-8") as f:
-                json.dump(out, f, indent=2)
+            _dump_json(out, code_file)
         except Exception as e:
             # Fallback: write error marker (non-fatal)
             with open(code_file, "w", encoding="utf-8") as f:
                 f.write(f'{{"error": "failed to serialize plot generator: {e}"}}')
     
-    def _save_stock_service_code(self, stock_service: Any, filepath: Path):
+    def _save_stock_service_code(self, stock_service: Any, filepath: Path, generated_at: Optional[str] = None):
         """Generate and save current stock service code"""
         enabled_features = [k for k, v in stock_service.capabilities.items() if v]
+        # Python literal (json.dumps would emit true/false and the snapshot would not import)
+        capabilities_src = "{\n" + "".join(
+            f"            {k!r}: {v!r},\n" for k, v in stock_service.capabilities.items()
+        ) + "        }"
         
-        code = f'''# Auto-generated StockService v{stock_service.version}
-# Generated at: {datetime.now().isoformat()}
-
+        header = f'''# Auto-generated StockService v{stock_service.version}
+# Generated at: {generated_at or datetime.now().isoformat()}
+'''
+        code = f'''
 import yfinance as yf
 import pandas as pd
 import numpy as np
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List
 
+@lru_cache(maxsize=32)
+def _fetch_histories(symbols: tuple, start: str) -> Dict[str, pd.DataFrame]:
+    # single batched request; columns are (ticker, field) with group_by="ticker"
+    raw = yf.download(list(symbols), start=start, group_by="ticker",
+                      auto_adjust=True, threads=True, progress=False)
+    if not isinstance(raw.columns, pd.MultiIndex):
+        return {{symbols[0]: raw}}
+    return {{s: raw[s].dropna(how="all") for s in symbols if s in raw.columns.get_level_values(0)}}
+
 class StockServiceV{stock_service.version}:
     """Stock service with evolved capabilities"""
     
     def __init__(self):
         self.version = {stock_service.version}
-        self.capabilities = {json.dumps(stock_service.capabilities, indent=8)}
+        self.capabilities = {capabilities_src}
     
     def get_stock_prices(self, symbols: List[str]) -> Dict[str, pd.DataFrame]:
         """Fetch stock data with enhanced features"""
         # Enabled capabilities: {', '.join(enabled_features)}
         
         data = {{}}
+        start = f"{{datetime.now().year}}-01-01"
+        frames = _fetch_histories(tuple(symbols), start)
         for symbol in symbols:
-            ticker = yf.Ticker(symbol)
-            df = ticker.history(start=f"{{datetime.now().year}}-01-01")
-'''
-        
-        # Add capability-specific code
-        if stock_service.capabilities.get("moving_averages"):
-            code += '''
-            # Moving averages
-            df['MA20'] = df['Close'].rolling(window=20).mean()
-            df['MA50'] = df['Close'].rolling(window=50).mean()
+            df = frames.get(symbol, pd.DataFrame()).copy()
 '''
         
-        if stock_service.capabilities.get("rsi"):
-            code += '''
-            # RSI calculation
-            delta = df['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            df['RSI'] = 100 - (100 / (1 + rs))
-'''
-        
-        if stock_service.capabilities.get("volatility"):
-            code += '''
-            # Volatility
-            returns = df['Close'].pct_change()
-            df['Volatility'] = returns.rolling(window=20).std() * np.sqrt(252)
-'''
-        
-        code += '''
-            data[symbol] = df
-        return data
-'''
-        filepath.write_text(code, encoding='utf-8')
+        # Capability-specific blocks: per-symbol ones go inside the fetch loop, cross-symbol ones after it
+        caps = stock_service.capabilities
+        parts = [code]
+        parts.extend(snippet for names, snippet in _SERVICE_SYMBOL_SNIPPETS if any(caps.get(n) for n in names))
+        parts.append(_SERVICE_LOOP_END)
+        if caps.get("volatility") or caps.get("correlation"):
+            parts.append(_SERVICE_CLOSE_MAT)
+        parts.extend(snippet for names, snippet in _SERVICE_CROSS_SNIPPETS if any(caps.get(n) for n in names))
+        parts.append(_SERVICE_RETURN)
+        code = "".join(parts)
+        # dedupe on the exact bytes written so every snapshot keeps its own "Generated at" header
+        self._write_deduped(filepath, (header + code).encode('utf-8'))
     
     def _save_stock_data(self, stock_data: Dict[str, pd.DataFrame], filepath: Path):
         """Save stock data snapshot"""
         data_dict = {}
         for symbol, df in stock_data.items():
             if not df.empty:
-                # Save last 5 rows as sample
-                sample = df.tail(5).to_dict(orient='records')
+                # Save last 5 rows as sample (itertuples yields native Python scalars)
+                tail = df.iloc[-5:]
+                cols = tail.columns.tolist()
+                sample = [dict(zip(cols, row)) for row in tail.itertuples(index=False, name=None)]
                 data_dict[symbol] = {
                     "shape": list(df.shape),
-                    "columns": list(df.columns),
+                    "columns": cols,
                     "sample": sample,
                     "date_range": [str(df.index[0]), str(df.index[-1])]
                 }
         
-        with open(filepath, 'w') as f:
-            json.dump(data_dict, f, indent=2, default=str)
+        _dump_json(data_dict, filepath, default=str, compress=self.compress)
     
     def _save_metadata(self):
         """Save case metadata"""
         if self.current_case_dir:
-            metadata_file = self.current_case_dir / "metadata.json"
-            with open(metadata_file, 'w') as f:
-                json.dump(self.metadata, f, indent=2, default=str)
+            buf = _json_bytes(self.metadata, default=str)
+            if buf == self._last_meta_bytes:
+                return
+            _write_atomic(self.current_case_dir / "metadata.json", buf)
+            self._last_meta_bytes = buf
     
     def generate_evolution_report(self) -> str:
         """Generate a markdown report of the evolution"""
         if not self.current_case_dir:
             return "No active case"
         
-        report = f"""# Code Evolution Report
+        out = io.StringIO()
+        write = out.write
+        write(f"""# Code Evolution Report
 ## Case: {self.metadata['case_name']}
 ## Symbols: {', '.join(self.metadata['symbols'])}
 ## Created: {self.metadata['created_at']}
 
 ## Evolution Timeline
 
-"""
-        for iteration in self.metadata.get("iterations", []):
-            report += f"""
-### Iteration {iteration['iteration']} ({iteration['type']})
-- **Timestamp**: {iteration['timestamp']}
-- **Plot Version**: v{iteration['plot_version']}
-- **Service Version**: v{iteration['service_version']}
-- **Artifacts**:
-"""
-            for artifact_type, path in iteration['artifacts'].items():
-                report += f"  - {artifact_type}: `{Path(path).name}`\n"
-            
-            # List enabled features
-            plot_features = [k for k, v in iteration['features']['plot'].items() if v and v != "default"]
-            service_features = [k for k, v in iteration['features']['service'].items() if v]
-            
-            if plot_features:
-                report += f"- **Plot Features**: {', '.join(plot_features)}\n"
-            if service_features:
-                report += f"- **Service Capabilities**: {', '.join(service_features)}\n"
+""")
+        iterations = self.metadata.get("iterations", [])
+        if len(self._cols["iteration"]) != len(iterations):
+            # metadata was replaced/edited outside save_iteration: rebuild the columns once
+            self._cols = {c: [] for c in _ITER_COLUMNS}
+            for info in iterations:
+                self._append_iteration_row(info)
+        cols = self._cols
+        for row in zip(*(cols[c] for c in _ITER_COLUMNS)):
+            write(_ITER_REPORT_TPL.format(*row))
+        
+        critic_stops = self.metadata.get("critic_stops", [])
+        if critic_stops:
+            write("\n## Critic Loop Outcomes\n")
+            for stop in critic_stops:
+                write(f"- User iteration {stop['outer_iteration']}: {stop['reason']} after {stop['turns_used']} turn(s)\n")
         
-        report += "\n## Summary\n"
-        report += f"- Total Iterations: {len(self.metadata.get('iterations', []))}\n"
-        report += f"- Final Plot Version: v{self.metadata['iterations'][-1]['plot_version'] if self.metadata.get('iterations') else 1}\n"
-        report += f"- Final Service Version: v{self.metadata['iterations'][-1]['service_version'] if self.metadata.get('iterations') else 1}\n"
+        write("\n## Summary\n")
+        write(f"- Total Iterations: {len(cols['iteration'])}\n")
+        write(f"- Final Plot Version: v{cols['plot_version'][-1] if cols['plot_version'] else 1}\n")
+        write(f"- Final Service Version: v{cols['service_version'][-1] if cols['service_version'] else 1}\n")
         
-        # Save report
+        # Save report (single buffered write; callers also need the text back)
+        report = out.getvalue()
         report_file = self.current_case_dir / "evolution_report.md"
-        report_file.write_text(report, encoding='utf-8')
+        with open(report_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write(report)
         
         return report
     
     def list_cases(self) -> List[Dict[str, Any]]:
         """List all available cases"""
         cases = []
-        for case_dir in self.base_dir.iterdir():
-            if case_dir.is_dir():
-                metadata_file = case_dir / "metadata.json"
-                if metadata_file.exists():
-                    with open(metadata_file, 'r') as f:
-                        metadata = json.load(f)
-                        cases.append({
-                            "name": case_dir.name,
-                            "created": metadata.get("created_at"),
-                            "symbols": metadata.get("symbols"),
-                            "iterations": len(metadata.get("iterations", []))
-                        })
-        return sorted(cases, key=lambda x: x["created"], reverse=True)
+        # scandir reports the entry type from the directory listing (no stat per entry)
+        with os.scandir(self.base_dir) as it:
+            for entry in it:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                try:
+                    metadata = _load_json(os.path.join(entry.path, "metadata.json"))
+                except FileNotFoundError:
+                    continue
+                cases.append({
+                    "name": entry.name,
+                    "created": metadata.get("created_at"),
+                    "symbols": metadata.get("symbols"),
+                    "iterations": len(metadata.get("iterations", ()))
+                })
+        return sorted(cases, key=itemgetter("created"), reverse=True)
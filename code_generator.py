@@ -2,19 +2,13 @@ from typing import List, Dict, Any
 from datetime import datetime
 import os
 
-class CodeGenerator:
-    """Generate standalone executable code based on current system state"""
-    
-    @staticmethod
-    def generate_plot_code(symbols: List[str], plot_generator: Any, stock_service: Any) -> str:
-        """Generate standalone Python code for plotting stocks"""
-        
-        # Start with imports
-        code = """import yfinance as yf
+# Script sections; joined once and rendered with a single format_map (literal braces are doubled)
+_HEADER_TMPL = """import yfinance as yf
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import hashlib
 import os
 
 # Stock symbols to analyze
@@ -25,17 +19,41 @@ print("Fetching stock data...")
 data = {{}}
 start_date = f"{{datetime.now().year}}-01-01"
 
-for symbol in symbols:
+# Re-runs on the same day reuse a Parquet copy of the download (needs pyarrow or fastparquet)
+cache_key = hashlib.sha1(repr((symbols, start_date, str(datetime.now().date()))).encode()).hexdigest()[:16]
+cache_file = os.path.join('.cache', f"{{cache_key}}.parquet")
+raw = None
+if os.path.exists(cache_file):
+    try:
+        raw = pd.read_parquet(cache_file)
+    except Exception:
+        raw = None  # unreadable cache or no Parquet engine: download again
+
+# One batched request for all symbols; columns are (ticker, field) with group_by="ticker"
+if raw is None:
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(start=start_date)
-        if not df.empty:
-            data[symbol] = df
-            print(f"✓ Fetched data for {{symbol}}")
-        else:
-            print(f"✗ No data for {{symbol}}")
+        raw = yf.download(symbols, start=start_date, group_by="ticker",
+                          auto_adjust=True, threads=True, progress=False)
     except Exception as e:
-        print(f"✗ Error fetching {{symbol}}: {{e}}")
+        print(f"✗ Error fetching data: {{e}}")
+        raw = pd.DataFrame()
+    if not raw.empty:
+        try:
+            os.makedirs('.cache', exist_ok=True)
+            raw.to_parquet(cache_file)
+        except Exception:
+            pass  # caching is best-effort
+
+for symbol in symbols:
+    if isinstance(raw.columns, pd.MultiIndex):
+        df = raw[symbol].dropna(how="all") if symbol in raw.columns.get_level_values(0) else pd.DataFrame()
+    else:
+        df = raw.dropna(how="all") if len(symbols) == 1 else pd.DataFrame()
+    if not df.empty:
+        data[symbol] = df
+        print(f"✓ Fetched data for {{symbol}}")
+    else:
+        print(f"✗ No data for {{symbol}}")
 
 if not data:
     print("ERROR: No stock data fetched!")
@@ -43,95 +61,74 @@ if not data:
 
 # Create the plot
 print("Creating plot...")
-""".format(symbols=symbols)
-        
-        # Add plot configuration based on features
-        features = plot_generator.current_features
-        
-        # Set up figure
-        if features.get("volume_subplot"):
-            code += """fig, (ax1, ax2) = plt.subplots(2, 1, figsize={}, gridspec_kw={{'height_ratios': [3, 1]}})
-""".format(features["figure_size"])
-        else:
-            code += """fig, ax1 = plt.subplots(figsize={})
-""".format(features["figure_size"])
-        
-        # Add main plotting logic
-        code += """
+"""
+
+_FIGURE_VOLUME_TMPL = """fig, (ax1, ax2) = plt.subplots(2, 1, figsize={figure_size}, gridspec_kw={{'height_ratios': [3, 1]}})
+"""
+
+_FIGURE_TMPL = """fig, ax1 = plt.subplots(figsize={figure_size})
+"""
+
+_MAIN_TMPL = """
 # Plot each stock
 for idx, (symbol, df) in enumerate(data.items()):
     # Calculate percentage change from start of year
     initial_price = df['Close'].iloc[0]
     pct_change = ((df['Close'] - initial_price) / initial_price) * 100
-    
+
     # Main price line
-    line = ax1.plot(df.index, pct_change, label=symbol, linewidth={})
-""".format(features.get("line_width", 2))
-        
-        # Add feature-specific code
-        if features.get("moving_average"):
-            code += """    
+    line = ax1.plot(df.index, pct_change, label=symbol, linewidth={line_width})
+"""
+
+# Per-stock feature blocks, in emission order
+_FEATURE_BLOCKS = (
+    ("moving_average", """
     # Add moving average
     if len(df) > 20:
         ma20 = pct_change.rolling(window=20).mean()
         ax1.plot(df.index, ma20, '--', label=f"{{symbol}} MA20", alpha=0.7)
-"""
-        
-        if features.get("annotations"):
-            code += """    
+"""),
+    ("annotations", """
     # Add annotations
     latest_value = pct_change.iloc[-1]
-    ax1.annotate(f'{{latest_value:.1f}}%', 
+    ax1.annotate(f'{{latest_value:.1f}}%',
                 xy=(df.index[-1], latest_value),
                 xytext=(10, 5), textcoords='offset points',
                 fontsize=9, bbox=dict(boxstyle='round,pad=0.3', facecolor='yellow', alpha=0.7))
-"""
-        
-        if features.get("highlight_peaks"):
-            code += """    
+"""),
+    ("highlight_peaks", """
     # Highlight peaks and valleys
     max_idx = pct_change.idxmax()
     min_idx = pct_change.idxmin()
     ax1.scatter([max_idx], [pct_change[max_idx]], color='green', s=100, zorder=5, marker='^')
     ax1.scatter([min_idx], [pct_change[min_idx]], color='red', s=100, zorder=5, marker='v')
-"""
-        
-        if features.get("volume_subplot"):
-            code += """    
+"""),
+    ("volume_subplot", """
     # Add volume subplot
     if 'Volume' in df.columns:
         ax2.bar(df.index, df['Volume'], alpha=0.3, label=f"{{symbol}} Volume")
-"""
-        
-        # Configure plot
-        code += """
+"""),
+)
+
+_CONFIGURE_TMPL = """
 # Configure main plot
-ax1.set_title(f"YTD Stock Gains - {{datetime.now().year}} (v{})", fontsize={})
-ax1.set_xlabel("Date", fontsize={})
-ax1.set_ylabel("Gain (%)", fontsize={})
+ax1.set_title(f"YTD Stock Gains - {{datetime.now().year}} (v{version})", fontsize={title_size})
+ax1.set_xlabel("Date", fontsize={label_size})
+ax1.set_ylabel("Gain (%)", fontsize={label_size})
 ax1.legend(loc='best')
-ax1.grid({}, alpha={})
+ax1.grid({grid}, alpha={grid_alpha})
 ax1.axhline(y=0, color='black', linestyle='-', linewidth=0.5, alpha=0.5)
-""".format(
-            plot_generator.version,
-            features.get("title_size", 16),
-            features.get("label_size", 12),
-            features.get("label_size", 12),
-            features.get("grid", True),
-            features.get("grid_alpha", 0.3)
-        )
-        
-        if features.get("volume_subplot"):
-            code += """
+"""
+
+_CONFIGURE_VOLUME_TMPL = """
 # Configure volume subplot
-ax2.set_xlabel("Date", fontsize={})
-ax2.set_ylabel("Volume", fontsize={})
+ax2.set_xlabel("Date", fontsize={label_size})
+ax2.set_ylabel("Volume", fontsize={label_size})
 ax2.legend(loc='best')
 ax2.grid(True, alpha=0.3)
-""".format(features.get("label_size", 12), features.get("label_size", 12))
-        
-        # Save the plot
-        code += """
+"""
+
+_SAVE_TMPL = """
 # Save the plot
 plt.tight_layout()
 
@@ -140,17 +137,44 @@ output_dir = 'coding'
 os.makedirs(output_dir, exist_ok=True)
 output_file = os.path.join(output_dir, 'ytd_stock_gains.png')
 
-plt.savefig(output_file, dpi={}, bbox_inches='tight')
+plt.savefig(output_file, dpi={dpi}, bbox_inches='tight')
 plt.close()
 
 print(f"✓ Plot saved as {{output_file}}")
-""".format(features.get("dpi", 300))
+"""
+
+class CodeGenerator:
+    """Generate standalone executable code based on current system state"""
+    
+    @staticmethod
+    def generate_plot_code(symbols: List[str], plot_generator: Any, stock_service: Any) -> str:
+        """Generate standalone Python code for plotting stocks"""
+        features = plot_generator.current_features
+        volume = bool(features.get("volume_subplot"))
+        
+        # Pick sections by feature, then render everything in one pass
+        parts = [_HEADER_TMPL, _FIGURE_VOLUME_TMPL if volume else _FIGURE_TMPL, _MAIN_TMPL]
+        parts.extend(block for name, block in _FEATURE_BLOCKS if features.get(name))
+        parts.append(_CONFIGURE_TMPL)
+        if volume:
+            parts.append(_CONFIGURE_VOLUME_TMPL)
+        parts.append(_SAVE_TMPL)
         
-        return code
+        values = {
+            "symbols": symbols,
+            "figure_size": features.get("figure_size"),
+            "line_width": features.get("line_width", 2),
+            "version": plot_generator.version,
+            "title_size": features.get("title_size", 16),
+            "label_size": features.get("label_size", 12),
+            "grid": features.get("grid", True),
+            "grid_alpha": features.get("grid_alpha", 0.3),
+            "dpi": features.get("dpi", 300),
+        }
+        return "".join(parts).format_map(values)
     
     @staticmethod
     def save_generated_code(code: str, filepath: str):
         """Save generated code to file"""
         with open(filepath, 'w') as f:
             f.write(code)
-
@@ -1,4 +1,6 @@
+import copy
 import os
+from functools import lru_cache
 try:
     import streamlit as st  # existing behavior
 except ImportError:
@@ -27,6 +29,9 @@ class Config:
         self.model_writer = os.getenv("AZURE_OPENAI_CODE_WRITER", self.default_model).strip()
         self.model_critic = os.getenv("AZURE_OPENAI_CODE_CRITIC", self.default_model).strip()
         self.model_exe = os.getenv("AZURE_OPENAI_CODE_EXE", self.default_model).strip()
+        
+        # Opt-in JSON mode for the evaluator (only for deployments that accept response_format)
+        self.eval_json_mode = os.getenv("AZURE_OPENAI_EVAL_JSON_MODE", "").strip().lower() in ("1", "true", "yes")
 
     def validate(self):
         missing = [k for k, v in {
@@ -63,21 +68,39 @@ def build_llm_config(model: str | None = None) -> Dict[str, Any]:
     """Return generic llm_config (single model) for an agent (works without Streamlit)."""
     sess = getattr(st, "session_state", {})
     chosen = model or sess.get("model", _env.default_model)
-    entry = _build_single_entry(chosen)
+    return _with_session_settings(_build_single_entry(chosen), sess)
+
+def _with_session_settings(entry: Dict[str, Any], sess) -> Dict[str, Any]:
+    """Wrap a model entry with the current session's timeout/seed (never cached: sessions differ)."""
     return {
         "config_list": [entry],
         "timeout": sess.get("timeout", 60),
         "seed": sess.get("seed", 42),
     }
 
-def build_role_llm_config(role: str) -> Dict[str, Any]:
+@lru_cache(maxsize=8)
+def _cached_role_entry(role: str) -> Dict[str, Any]:
+    """Session-independent part of a role's config: the model entry built from env settings."""
     role_map = {
         "writer": _env.model_writer,
         "critic": _env.model_critic,
         "exe": _env.model_exe,
     }
-    model = role_map.get(role.lower(), _env.default_model)
-    return build_llm_config(model)
+    model = role_map.get(role, _env.default_model)
+    return _build_single_entry(model)
+
+def build_role_llm_config(role: str) -> Dict[str, Any]:
+    """Return llm_config for a role: cached model entry (copied; callers may mutate) + session settings."""
+    entry = copy.deepcopy(_cached_role_entry(role.lower()))
+    return _with_session_settings(entry, getattr(st, "session_state", {}))
+
+def eval_json_mode() -> bool:
+    """Whether the evaluator agent should request response_format=json_object."""
+    return _env.eval_json_mode
+
+def clear_llm_config_cache() -> None:
+    """Drop cached role entries (call after changing env vars)."""
+    _cached_role_entry.cache_clear()
 
 # --- IMAGE GENERATION CONFIG ------------------------------------------------
 
@@ -91,5 +114,7 @@ __all__ = [
     "Config",
     "build_llm_config",
     "build_role_llm_config",
+    "clear_llm_config_cache",
+    "eval_json_mode",
     "build_image_request_url",
 ]
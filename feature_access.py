@@ -0,0 +1,22 @@
+from typing import Any
+
+_SENTINEL = object()
+
+
+def first_attr(obj: Any, *names: str, default: Any = None) -> Any:
+    """Return the first attribute among `names` that exists (even if empty/falsy), probing each once."""
+    for name in names:
+        value = getattr(obj, name, _SENTINEL)
+        if value is not _SENTINEL:
+            return value
+    return default
+
+
+def get_feature_dict(pg) -> dict:
+    """Return plot feature dict supporting both legacy 'current_features' and new 'features'."""
+    return first_attr(pg, "current_features", "features") or {}
+
+
+def get_capability_dict(service) -> dict:
+    """Return stock service capability dict supporting both 'capabilities' and legacy 'features'."""
+    return first_attr(service, "capabilities", "features") or {}
@@ -1,6 +1,34 @@
 import re
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from typing import Dict, Any, List, Tuple, Optional, Callable
+from typing import Dict, Any, List, Tuple, Optional, Callable, FrozenSet
+import numpy as np
+from keyword_scanner import KeywordScanner
+
+# Fixed vocabularies (improvement categories and priority tokens are per-instance)
+_APPROVAL_TERMS = ("approved", "excellent", "perfect", "great job", "well done", "looks good")
+_REJECT_PHRASES = ("not approved", "rejected", "needs work")
+_POSITIVE_WEIGHTS = {
+    "excellent": 3, "perfect": 3, "great": 2, "professional": 2,
+    "good": 1, "clear": 1, "accurate": 1, "well": 1
+}
+_NEGATIVE_WEIGHTS = {
+    "error": 3, "wrong": 3, "missing": 2, "bad": 2,
+    "poor": 2, "unclear": 2, "confusing": 2,
+    "fix": 1, "improve": 1, "needs": 1, "add": 1, "should": 1
+}
+_ACTION_TERMS = ("improve", "needs", "should", "add", "consider", "enhance", "fix")
+_CATEGORY_TERMS = (
+    ("error", ("error", "bug", "crash", "fail")),
+    ("enhancement", ("improve", "enhance", "add", "include")),
+    ("modification", ("change", "modify", "adjust", "update")),
+)
+# Entries kept per evaluator in the scan / list-item LRU caches (agent loops re-present the same feedback)
+_CACHE_SIZE = 512
+# Every category _categorize_lower can return; the position is the record's category id
+_RECORD_CATEGORIES = ("approval", *(name for name, _ in _CATEGORY_TERMS), "general")
+_APPROVAL_ID = 0
+_GENERAL_ID = len(_RECORD_CATEGORIES) - 1
 
 @dataclass
 class FeedbackRecord:
@@ -11,14 +39,20 @@ class FeedbackRecord:
     confidence: float
     category: str
     improvements: List[Dict[str, Any]]
+    category_id: int = -1  # index into the evaluator's category names
 
 class FeedbackEvaluator:
     """Enhanced evaluator for both critic and user feedback"""
     # Precompiled patterns
+    # One pass per list style: the styles overlap (a numbered item runs to the next number or the end),
+    # so a single alternation would let one style swallow the others' items
     _NUMBERED_RE = re.compile(r'\b\d+\.\s*(.+?)(?=(?:\n\d+\.|\Z))', re.DOTALL)
     _BULLET_RE = re.compile(r'^[\-\*•]\s+(.+)', re.MULTILINE)
     _INLINE_SEMICOLON_RE = re.compile(r'(?:^|[\n])([^;\n]{4,}?);(?!;)')
     _MULTI_STEP_RE = re.compile(r'\b(first|second|third|fourth|lastly|finally|next)\b[:,]?\s+(.*?)(?=(?:\bfirst|\bsecond|\bthird|\bfourth|\blastly|\bfinally|\bnext)\b|$)', re.IGNORECASE | re.DOTALL)
+    _NORM_STRIP_RE = re.compile(r'[^\w\s%\-:,.]')
+    # Same filter for ASCII text as a translate table (derived from the regex so the two cannot drift)
+    _NORM_STRIP_TABLE = dict.fromkeys(map(ord, _NORM_STRIP_RE.findall("".join(map(chr, range(128))))))
 
     def __init__(
         self,
@@ -26,7 +60,15 @@ class FeedbackEvaluator:
         max_history: Optional[int] = 250,
         scoring_fn: Optional[Callable[[str], float]] = None
     ):
-        self.feedback_history: List[FeedbackRecord] = []
+        # max_history=None/0 keeps everything; the deque drops the oldest record itself
+        self.feedback_history: deque = deque(maxlen=max_history or None)
+        # Scores and category codes of feedback_history as parallel arrays; the live window
+        # is [_lo, _hi) and the buffer doubles (or compacts) when the end is reached
+        self._scores = np.empty(16, dtype=np.float64)
+        self._cat_codes = np.empty(16, dtype=np.intp)
+        self._lo = self._hi = 0
+        self._cat_names: List[str] = list(_RECORD_CATEGORIES)
+        self._cat_index: Dict[str, int] = {name: i for i, name in enumerate(self._cat_names)}
         self.max_history = max_history
         self.scoring_fn = scoring_fn
         self.improvement_keywords = improvement_keywords or {
@@ -46,32 +88,78 @@ class FeedbackEvaluator:
             "high": ["must", "required", "critical"],
             "medium": ["should", "important", "need"],
         }
+        # Every keyword any scoring/categorizing step looks for, matched in one scan per text
+        vocab = [kw for kws in self.improvement_keywords.values() for kw in kws]
+        vocab += [kw for kws in self._priority_tokens.values() for kw in kws]
+        vocab += [*_APPROVAL_TERMS, *_REJECT_PHRASES, *_POSITIVE_WEIGHTS, *_NEGATIVE_WEIGHTS, *_ACTION_TERMS, "not"]
+        vocab += [kw for _, kws in _CATEGORY_TERMS for kw in kws]
+        self._scanner = KeywordScanner(vocab)
+        # lowered text -> keywords found; every scoring/categorizing step reads through this
+        self._scan_cache: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        # stripped text -> explicit list items (tuple, copied out as a list)
+        self._items_cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+
+    def _scan(self, feedback_lower: str) -> FrozenSet[str]:
+        """Keywords present in feedback_lower; analyze() asks several times for the same text."""
+        cache = self._scan_cache
+        found = cache.get(feedback_lower)
+        if found is None:
+            found = cache[feedback_lower] = self._scanner.scan(feedback_lower)
+            if len(cache) > _CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(feedback_lower)
+        return found
 
     def _preprocess_feedback(self, feedback: str) -> str:
         return feedback.strip()
 
     def _normalize_suggestion(self, text: str) -> str:
-        return re.sub(r'\s+', ' ', re.sub(r'[^\w\s%\-:,.]', '', text.lower())).strip()
+        lower = text.lower()
+        if lower.isascii():
+            kept = lower.translate(self._NORM_STRIP_TABLE)
+        else:
+            kept = self._NORM_STRIP_RE.sub('', lower)  # Unicode \w/\s rules
+        return " ".join(kept.split())  # split() uses the same whitespace set as \s
 
     def is_approved(self, feedback: str) -> bool:
         """Check if critic/user approved the output"""
-        approval_terms = ["approved", "excellent", "perfect", "great job", "well done", "looks good"]
-        f = feedback.lower()
-        return any(t in f for t in approval_terms)
+        return self._is_approved_lower(feedback.lower())
+
+    def _is_approved_lower(self, feedback_lower: str) -> bool:
+        found = self._scan(feedback_lower)
+        return any(t in found for t in _APPROVAL_TERMS)
 
     def _detect_categories(self, feedback_lower: str) -> List[Dict[str, Any]]:
         improvements = []
+        found = self._scan(feedback_lower)
+        if not found:
+            return improvements
+        priority = None  # same emphasis tokens for every category: resolve once, on first hit
         for category, keywords in self.improvement_keywords.items():
-            hits = [kw for kw in keywords if kw in feedback_lower]
+            hits = [kw for kw in keywords if kw in found]
             if hits:
+                if priority is None:
+                    priority = self._calculate_priority(feedback_lower, category)
                 improvements.append({
                     "category": category,
                     "detected_keywords": hits,
-                    "priority": self._calculate_priority(feedback_lower, category)
+                    "priority": priority
                 })
         return improvements
 
     def _extract_list_items(self, feedback: str) -> List[str]:
+        cache = self._items_cache
+        items = cache.get(feedback)
+        if items is None:
+            items = cache[feedback] = tuple(self._parse_list_items(feedback))
+            if len(cache) > _CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(feedback)
+        return list(items)
+
+    def _parse_list_items(self, feedback: str) -> List[str]:
         items = []
         items += self._NUMBERED_RE.findall(feedback)
         items += self._BULLET_RE.findall(feedback)
@@ -96,11 +184,14 @@ class FeedbackEvaluator:
 
     def extract_improvements(self, feedback: str) -> List[Dict[str, Any]]:
         """Extract structured improvements from feedback (categories + explicit suggestions)."""
+        return self._extract_improvements_lower(feedback, feedback.lower())
+
+    def _extract_improvements_lower(self, feedback: str, feedback_lower: str) -> List[Dict[str, Any]]:
         improvements: List[Dict[str, Any]] = []
         clean = self._preprocess_feedback(feedback)
-        lower = clean.lower()
 
-        improvements.extend(self._detect_categories(lower))
+        # Keyword presence does not depend on surrounding whitespace, so the unstripped lower works
+        improvements.extend(self._detect_categories(feedback_lower))
 
         for suggestion in self._extract_list_items(clean):
             improvements.append({
@@ -112,48 +203,41 @@ class FeedbackEvaluator:
 
     def _calculate_priority(self, feedback_lower: str, category: str) -> str:
         """Calculate priority based on feedback emphasis"""
-        if any(t in feedback_lower for t in self._priority_tokens["high"]):
+        found = self._scan(feedback_lower)
+        if any(t in found for t in self._priority_tokens["high"]):
             return "high"
-        if any(t in feedback_lower for t in self._priority_tokens["medium"]):
+        if any(t in found for t in self._priority_tokens["medium"]):
             return "medium"
         return "low"
 
     # Scoring decomposition
     def _score_sentiment(self, feedback_lower: str) -> Tuple[float, int]:
-        positive = {
-            "excellent": 3, "perfect": 3, "great": 2, "professional": 2,
-            "good": 1, "clear": 1, "accurate": 1, "well": 1
-        }
-        negative = {
-            "error": 3, "wrong": 3, "missing": 2, "bad": 2,
-            "poor": 2, "unclear": 2, "confusing": 2,
-            "fix": 1, "improve": 1, "needs": 1, "add": 1, "should": 1
-        }
+        found = self._scan(feedback_lower)
         score_raw = 0
         matched = 0
-        for k, w in positive.items():
-            if k in feedback_lower:
-                score_raw += w
+        for k in found:
+            if k in _POSITIVE_WEIGHTS:
+                score_raw += _POSITIVE_WEIGHTS[k]
                 matched += 1
-        for k, w in negative.items():
-            if k in feedback_lower:
-                score_raw -= w
+            if k in _NEGATIVE_WEIGHTS:
+                score_raw -= _NEGATIVE_WEIGHTS[k]
                 matched += 1
         # Normalize to 0..1 (range approx -10..+10 mapped)
         norm = (score_raw + 10) / 20
         return max(0.0, min(1.0, norm)), matched
 
     def _score_action_penalty(self, feedback_lower: str) -> float:
-        action_terms = ["improve", "needs", "should", "add", "consider", "enhance", "fix"]
-        hits = sum(1 for t in action_terms if t in feedback_lower)
+        found = self._scan(feedback_lower)
+        hits = sum(1 for t in _ACTION_TERMS if t in found)
         if hits == 0:
             return 0.0
         return min(0.25, 0.05 * hits)  # cap penalty
 
     def _apply_approval_adjustments(self, base: float, feedback_lower: str) -> float:
-        if "approved" in feedback_lower and "not" not in feedback_lower:
+        found = self._scan(feedback_lower)
+        if "approved" in found and "not" not in found:
             base = max(base, 0.7)
-        if any(p in feedback_lower for p in ["not approved", "rejected", "needs work"]):
+        if any(p in found for p in _REJECT_PHRASES):
             base = min(base, 0.4)
         return base
 
@@ -161,40 +245,58 @@ class FeedbackEvaluator:
         """Composite score 0..1 using sentiment minus action penalty + approval adjustment."""
         if self.scoring_fn:
             return max(0.0, min(1.0, self.scoring_fn(feedback)))
-        lower = feedback.lower()
-        sentiment, _ = self._score_sentiment(lower)
-        penalty = self._score_action_penalty(lower)
+        return self._score_quality_lower(feedback.lower())
+
+    def _score_quality_lower(self, feedback_lower: str) -> float:
+        return self._score_parts_lower(feedback_lower)[0]
+
+    def _score_parts_lower(self, feedback_lower: str) -> Tuple[float, float, int]:
+        """(score, sentiment, matched); analyze() hands the sentiment part on to the confidence."""
+        sentiment, matched = self._score_sentiment(feedback_lower)
+        penalty = self._score_action_penalty(feedback_lower)
         score = sentiment - penalty
-        score = self._apply_approval_adjustments(score, lower)
-        return max(0.0, min(1.0, score))
+        score = self._apply_approval_adjustments(score, feedback_lower)
+        return max(0.0, min(1.0, score)), sentiment, matched
 
     def _confidence(self, feedback: str) -> float:
-        lower = feedback.lower()
-        tokens = re.findall(r'\b\w+\b', lower)
+        return self._confidence_lower(feedback.lower())
+
+    def _confidence_lower(self, feedback_lower: str) -> float:
+        return self._confidence_given(feedback_lower, *self._score_sentiment(feedback_lower))
+
+    def _confidence_given(self, feedback_lower: str, sentiment: float, matched: int) -> float:
+        tokens = re.findall(r'\b\w+\b', feedback_lower)
         if not tokens:
             return 0.3
-        sentiment, matched = self._score_sentiment(lower)
         return max(0.1, min(1.0, (matched / len(tokens)) + 0.1 * (0.5 - abs(sentiment - 0.5))))
 
     def categorize_feedback(self, feedback: str) -> str:
         """Categorize feedback type"""
-        lower = feedback.lower()
-        if self.is_approved(feedback):
-            return "approval"
-        if any(w in lower for w in ["error", "bug", "crash", "fail"]):
-            return "error"
-        if any(w in lower for w in ["improve", "enhance", "add", "include"]):
-            return "enhancement"
-        if any(w in lower for w in ["change", "modify", "adjust", "update"]):
-            return "modification"
-        return "general"
+        return self._categorize_lower(feedback.lower())
+
+    def _categorize_lower(self, feedback_lower: str) -> str:
+        return _RECORD_CATEGORIES[self._categorize_id_lower(feedback_lower)]
+
+    def _categorize_id_lower(self, feedback_lower: str) -> int:
+        if self._is_approved_lower(feedback_lower):
+            return _APPROVAL_ID
+        found = self._scan(feedback_lower)
+        for cat_id, (_, terms) in enumerate(_CATEGORY_TERMS, 1):
+            if any(w in found for w in terms):
+                return cat_id
+        return _GENERAL_ID
 
     def analyze(self, feedback: str, source: Optional[str] = None, iteration: Optional[int] = None, mutate: bool = False) -> Dict[str, Any]:
         """Analyze feedback; mutate history only if mutate=True."""
-        score = self.score_quality(feedback)
-        conf = self._confidence(feedback)
-        improvements = self.extract_improvements(feedback)
-        category = self.categorize_feedback(feedback)
+        lower = feedback.lower()  # shared by every scoring/categorizing step below
+        if self.scoring_fn:
+            score = self.score_quality(feedback)
+            conf = self._confidence_lower(lower)
+        else:
+            score, sentiment, matched = self._score_parts_lower(lower)
+            conf = self._confidence_given(lower, sentiment, matched)
+        improvements = self._extract_improvements_lower(feedback, lower)
+        category = self._categorize_lower(lower)
         record = {
             "feedback": feedback,
             "source": source,
@@ -230,23 +332,57 @@ class FeedbackEvaluator:
             score=data["score"],
             confidence=data["confidence"],
             category=data["category"],
-            improvements=data["improvements"]
+            improvements=data["improvements"],
+            category_id=self._category_id(data["category"])
         )
-        self.feedback_history.append(rec)
-        if self.max_history and len(self.feedback_history) > self.max_history:
-            self.feedback_history = self.feedback_history[-self.max_history:]
+        history = self.feedback_history
+        if history.maxlen is not None and len(history) == history.maxlen:
+            self._lo += 1  # oldest record is evicted by the append below
+        history.append(rec)
+        self._track(rec.score, rec.category_id)
+
+    def _category_id(self, category: str) -> int:
+        """Id for a category name; names outside _RECORD_CATEGORIES (custom precomputed records) get new ids."""
+        cat_id = self._cat_index.get(category)
+        if cat_id is None:
+            cat_id = self._cat_index[category] = len(self._cat_names)
+            self._cat_names.append(category)
+        return cat_id
+
+    def _track(self, score: float, cat_id: int):
+        if self._hi == len(self._scores):
+            lo, hi = self._lo, self._hi
+            if lo >= hi - lo:
+                # mostly evicted slots: slide the live window back to the front
+                self._scores[:hi - lo] = self._scores[lo:hi]
+                self._cat_codes[:hi - lo] = self._cat_codes[lo:hi]
+                self._lo, self._hi = 0, hi - lo
+            else:
+                self._scores = np.resize(self._scores, 2 * hi)
+                self._cat_codes = np.resize(self._cat_codes, 2 * hi)
+        self._scores[self._hi] = score
+        self._cat_codes[self._hi] = cat_id
+        self._hi += 1
+
+    def _category_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per category code: (record count, score sum) over the live window."""
+        codes = self._cat_codes[self._lo:self._hi]
+        n = len(self._cat_names)
+        return (np.bincount(codes, minlength=n),
+                np.bincount(codes, weights=self._scores[self._lo:self._hi], minlength=n))
 
     def get_feedback_trends(self) -> Dict[str, Any]:
         """Analyze feedback trends over iterations"""
         if not self.feedback_history:
             return {}
-        scores = [r.score for r in self.feedback_history]
-        categories = [r.category for r in self.feedback_history]
-        improving = "improving" if len(scores) > 1 and scores[-1] > scores[0] else ("declining" if len(scores) > 1 and scores[-1] < scores[0] else "stable")
+        scores = self._scores[self._lo:self._hi]
+        first, last = scores[0], scores[-1]
+        improving = "improving" if len(scores) > 1 and last > first else ("declining" if len(scores) > 1 and last < first else "stable")
+        counts, _ = self._category_stats()
         return {
-            "average_score": sum(scores) / len(scores),
+            "average_score": float(scores.mean()),
             "score_trend": improving,
-            "most_common_category": max(set(categories), key=categories.count),
+            "most_common_category": self._cat_names[int(counts.argmax())],
             "total_feedback": len(self.feedback_history)
         }
 
@@ -254,14 +390,10 @@ class FeedbackEvaluator:
         """Get detailed trends including category-specific averages."""
         if not self.feedback_history:
             return {}
-        per_cat: Dict[str, List[float]] = {}
-        for r in self.feedback_history:
-            per_cat.setdefault(r.category, []).append(r.score)
-        cat_avg = {k: sum(v) / len(v) for k, v in per_cat.items()}
-        last5 = self.feedback_history[-5:]
-        last5_avg = sum(r.score for r in last5) / len(last5)
-        overall = sum(r.score for r in self.feedback_history) / len(self.feedback_history)
-        delta_recent = last5_avg - overall
+        counts, sums = self._category_stats()
+        cat_avg = {self._cat_names[i]: float(sums[i] / counts[i]) for i in np.flatnonzero(counts)}
+        scores = self._scores[self._lo:self._hi]
+        delta_recent = float(scores[-5:].mean() - scores.mean())
         return {
             "category_averages": cat_avg,
             "recent_avg_vs_overall_delta": delta_recent,
@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Tuple
+try:
+    import ahocorasick  # optional: one-pass multi-keyword scan
+except ImportError:
+    ahocorasick = None
+
+
+class KeywordScanner:
+    """Substring presence test for a fixed keyword set: one Aho-Corasick pass when available."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+        self._automaton = None
+        if ahocorasick is not None and self.keywords:
+            automaton = ahocorasick.Automaton()
+            for kw in self.keywords:
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        """Keywords occurring anywhere in text (same semantics as `kw in text`)."""
+        if self._automaton is not None:
+            return frozenset(kw for _, kw in self._automaton.iter(text))
+        return frozenset(kw for kw in self.keywords if kw in text)
+
+
+@lru_cache(maxsize=16)
+def shared_scanner(keywords: Tuple[str, ...]) -> KeywordScanner:
+    """One scanner per distinct keyword set, shared across instances (evolve keyword maps)."""
+    return KeywordScanner(keywords)
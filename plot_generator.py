@@ -1,10 +1,36 @@
 import json
+import sys
 import os
 import re
+import hashlib
+from collections import OrderedDict, deque
 from datetime import datetime
 from typing import Dict, Any
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from keyword_scanner import shared_scanner
+try:
+    import plotly.graph_objects as go  # optional: interactive rendering without PNG files
+    from plotly.subplots import make_subplots
+except ImportError:
+    go = make_subplots = None
+
+
+def _pyplot():
+    """matplotlib.pyplot, imported on first render (matplotlib is a heavy import for non-plotting callers)."""
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        import matplotlib
+        matplotlib.use("Agg")  # headless app: plots only ever go to PNG files
+        import matplotlib.pyplot as plt
+    return plt
+
+
+def _mtime_ns(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
 
 class PlotGenerator:
@@ -15,6 +41,7 @@ class PlotGenerator:
         self.history = []
         self.improvements = []
         self.plot_history = []  # NEW: backward-compatible list of generated plots
+        self.recent_plots = deque(maxlen=6)  # last few plot_history entries for the UI gallery
         # Core adjustable knobs (extend here)
         self.features = {
             "style": "ggplot",
@@ -38,62 +65,130 @@ class PlotGenerator:
             "volume": "volume",
             "style": "style",
         }
+        # Bumped on every feature mutation; drives the active_features_str memo
+        self._features_version = 0
+        self._active_str_version = -1
+        self._active_features_str = ""
+        # render key -> (written PNG, its mtime_ns); identical re-renders reuse the file (see _render_key)
+        self._render_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Reusable Agg figure (outside pyplot's figure registry); rebuilt when its layout key changes
+        self._fig = None
+        self._fig_axes = ()
+        self._fig_key = None
 
     def evolve(self, feedback: str, improvement_type: str = "critic"):  # CHANGED signature
         """Backward-compatible evolve method (keeps optional improvement_type)."""
         self.version += 1
         fb_l = feedback.lower()
-        # Feature toggles (unchanged logic)
-        for k, feat in self._keyword_map.items():
-            if k in fb_l:
-                if feat == "style":
-                    if "classic" in fb_l:
-                        self.features["style"] = "classic"
-                    elif "default" in fb_l:
-                        self.features["style"] = "default"
-                else:
-                    self.features[feat] = True
+        # Feature toggles: one pass for all keywords, keyed by the current map so extensions are picked up
+        kw_map = self._keyword_map
+        for k in shared_scanner(tuple(kw_map)).scan(fb_l):
+            feat = kw_map[k]
+            if feat == "style":
+                if "classic" in fb_l:
+                    self.features["style"] = "classic"
+                elif "default" in fb_l:
+                    self.features["style"] = "default"
+            else:
+                self.features[feat] = True
+        self._features_version += 1
+        now_iso = datetime.now().isoformat()  # one clock read/format shared by both entries
         # Track improvement (NEW)
         self.improvements.append({
             "version": self.version,
             "feedback": feedback[:400],
             "type": improvement_type,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         })
         # Keep lightweight history entry too
-        self.history.append({"version": self.version, "feedback": feedback, "ts": datetime.now().isoformat()})
+        self.history.append({"version": self.version, "feedback": feedback, "ts": now_iso})
+
+    @property
+    def active_features_str(self) -> str:
+        """Comma-joined active feature names; recomputed only after a mutation."""
+        if self._active_str_version != self._features_version:
+            self._active_features_str = ", ".join(
+                k for k, v in self.features.items() if v and v != "default"
+            )
+            self._active_str_version = self._features_version
+        return self._active_features_str
 
     def _apply_style(self):
         try:
-            plt.style.use(self.features.get("style", "default"))
+            _pyplot().style.use(self.features.get("style", "default"))
         except Exception:
             pass  # silent fallback
 
+    def _figure(self, use_volume: bool):
+        """Cleared axes of the reusable figure, as (ax, volume_ax or None)."""
+        key = (tuple(self.features["figsize"]), use_volume, self.features.get("style"))
+        if key != self._fig_key:
+            # new size/layout, or a style change (rcParams are read when axes are created)
+            _pyplot()  # selects the Agg backend before any figure exists
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=self.features["figsize"])
+            FigureCanvasAgg(fig)
+            if use_volume:
+                axes = tuple(fig.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]}))
+            else:
+                axes = (fig.subplots(), None)
+            self._fig, self._fig_axes, self._fig_key = fig, axes, key
+        else:
+            for a in self._fig_axes:
+                if a is not None:
+                    a.clear()
+        return self._fig_axes
+
+    def _render_key(self, data: Dict[str, pd.DataFrame], filename: str) -> tuple:
+        """Everything the PNG depends on: version/year (title), features, output name and plotted columns."""
+        h = hashlib.blake2b(digest_size=16)
+        for symbol, df in data.items():
+            h.update(symbol.encode())
+            if df.empty:
+                continue
+            h.update(df.index.asi8.tobytes() if hasattr(df.index, "asi8") else str(df.index.tolist()).encode())
+            h.update(df['Close'].to_numpy().tobytes())
+            if self.features["volume"] and 'Volume' in df.columns:
+                h.update(df['Volume'].to_numpy().tobytes())
+        return (self.version, datetime.now().year, filename, tuple(sorted(self.features.items())), h.digest())
+
     def plot_stock_prices(self, data: Dict[str, pd.DataFrame], filename: str = "ytd_stock_gains.png") -> str:
+        if not re.search(r'_v\d+', filename):
+            filename = filename.replace(".png", f"_v{self.version}.png")
+        key = self._render_key(data, filename)
+        cached = self._render_cache.get(key)
+        if cached is not None and _mtime_ns(cached[0]) == cached[1]:  # file not rewritten/removed since
+            self._render_cache.move_to_end(key)
+            self._record_plot(filename)
+            return filename
+
         self._apply_style()
         use_volume = self.features["volume"]
-        if use_volume:
-            fig, (ax, axv) = plt.subplots(2, 1, figsize=self.features["figsize"], gridspec_kw={'height_ratios': [3, 1]})
-        else:
-            fig, ax = plt.subplots(figsize=self.features["figsize"])
+        ax, axv = self._figure(use_volume)
 
         for symbol, df in data.items():
             if df.empty:
                 continue
-            base = df['Close'].iloc[0]
-            pct = (df['Close'] / base - 1) * 100.0
-            line = ax.plot(df.index, pct, label=symbol, linewidth=self.features["line_width"])
+            # plain ndarrays: one division pass, no intermediate Series
+            close = df['Close'].to_numpy(dtype=float)
+            idx = df.index.to_numpy()
+            pct = (close / close[0] - 1.0) * 100.0
+            line = ax.plot(idx, pct, label=symbol, linewidth=self.features["line_width"])
             color = line[0].get_color()
 
             if self.features["moving_avg"] and len(pct) > 20:
-                ax.plot(df.index, pct.rolling(20).mean(), '--', linewidth=1, alpha=0.7, label=f"{symbol} MA20", color=color)
+                # 'valid' convolution == rolling(20).mean() without the 19 leading NaNs
+                ma = np.convolve(pct, np.full(20, 1 / 20), 'valid')
+                ax.plot(idx[19:], ma, '--', linewidth=1, alpha=0.7, label=f"{symbol} MA20", color=color)
 
             if self.features["peaks"]:
-                ax.scatter([pct.idxmax()], [pct.max()], marker='^', color='green', s=60, zorder=5)
-                ax.scatter([pct.idxmin()], [pct.min()], marker='v', color='red', s=60, zorder=5)
+                i_max, i_min = np.nanargmax(pct), np.nanargmin(pct)
+                ax.scatter([idx[i_max]], [pct[i_max]], marker='^', color='green', s=60, zorder=5)
+                ax.scatter([idx[i_min]], [pct[i_min]], marker='v', color='red', s=60, zorder=5)
 
             if self.features["annotate"]:
-                ax.annotate(f"{pct.iloc[-1]:.1f}%", xy=(df.index[-1], pct.iloc[-1]),
+                ax.annotate(f"{pct[-1]:.1f}%", xy=(idx[-1], pct[-1]),
                             xytext=(6, 4), textcoords="offset points",
                             fontsize=8, bbox=dict(boxstyle="round,pad=0.2", fc="yellow", alpha=0.5))
 
@@ -112,28 +207,73 @@ class PlotGenerator:
             axv.grid(alpha=0.2)
             axv.legend(fontsize=8)
 
-        plt.tight_layout()
+        self._fig.tight_layout()
 
-        if not re.search(r'_v\d+', filename):
-            filename = filename.replace(".png", f"_v{self.version}.png")
+        self._fig.savefig(filename, dpi=160)
+        self._render_cache[key] = (filename, _mtime_ns(filename))
+        if len(self._render_cache) > 8:
+            self._render_cache.popitem(last=False)
+        self._record_plot(filename)
+        return filename
 
-        plt.savefig(filename, dpi=160)
-        plt.close()
+    def _record_plot(self, filename: str):
         # NEW: append to plot_history (app expects this)
-        self.plot_history.append({
+        active = {k: v for k, v in self.features.items() if v}
+        now_iso = datetime.now().isoformat()
+        entry = {
             "version": self.version,
             "filename": filename,
-            "features": {k: v for k, v in self.features.items() if v},
-            "timestamp": datetime.now().isoformat()
-        })
+            "features": active,
+            "timestamp": now_iso
+        }
+        self.plot_history.append(entry)
+        self.recent_plots.append(entry)
         # Keep legacy summary history (unchanged)
         self.history.append({
             "version": self.version,
             "file": filename,
-            "features": {k: v for k, v in self.features.items() if v},
-            "ts": datetime.now().isoformat()
+            "features": dict(active),
+            "ts": now_iso
         })
-        return filename
+
+    def render_plotly(self, data: Dict[str, pd.DataFrame]):
+        """Interactive equivalent of plot_stock_prices (no file written); None when plotly is not installed."""
+        if go is None:
+            return None
+        use_volume = self.features["volume"]
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25]) if use_volume else go.Figure()
+        main = {"row": 1, "col": 1} if use_volume else {}
+
+        for symbol, df in data.items():
+            if df.empty:
+                continue
+            base = df['Close'].iloc[0]
+            pct = (df['Close'] / base - 1) * 100.0
+            fig.add_trace(go.Scatter(x=df.index, y=pct, mode="lines", name=symbol,
+                                     line={"width": self.features["line_width"]}), **main)
+
+            if self.features["moving_avg"] and len(pct) > 20:
+                fig.add_trace(go.Scatter(x=df.index, y=pct.rolling(20).mean(), mode="lines", name=f"{symbol} MA20",
+                                         line={"dash": "dash", "width": 1}, opacity=0.7), **main)
+
+            if self.features["peaks"]:
+                fig.add_trace(go.Scatter(x=[pct.idxmax(), pct.idxmin()], y=[pct.max(), pct.min()], mode="markers",
+                                         marker={"symbol": ["triangle-up", "triangle-down"],
+                                                 "color": ["green", "red"], "size": 10},
+                                         showlegend=False), **main)
+
+            if self.features["annotate"]:
+                fig.add_annotation(x=df.index[-1], y=pct.iloc[-1], text=f"{pct.iloc[-1]:.1f}%", showarrow=False,
+                                   xshift=24, font={"size": 10}, bgcolor="rgba(255, 255, 0, 0.5)", **main)
+
+            if use_volume and 'Volume' in df.columns:
+                fig.add_trace(go.Bar(x=df.index, y=df['Volume'], name=f"{symbol} Vol", opacity=0.25), row=2, col=1)
+
+        fig.add_hline(y=0, line_color="black", line_width=0.5, opacity=0.6, **main)
+        fig.update_layout(title=f"YTD Stock Gains {datetime.now().year} (v{self.version})", yaxis_title="Gain (%)")
+        fig.update_xaxes(showgrid=bool(self.features["grid"]))
+        fig.update_yaxes(showgrid=bool(self.features["grid"]))
+        return fig
 
     def summary(self) -> Dict[str, Any]:
         return {
@@ -150,15 +290,26 @@ class PlotGenerator:
             "improvement_history": self.improvements[-5:] if self.improvements else []
         }
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Point-in-time copy of the persisted state (safe to serialize on another thread)."""
+        return {
+            "version": self.version,
+            "features": dict(self.features),
+            "history": list(self.history),
+            "improvements": list(self.improvements),
+            "plot_history": list(self.plot_history)  # NEW
+        }
+
+    @staticmethod
+    def write_state(path: str, state: Dict[str, Any]):
+        """Write a to_dict() snapshot atomically (temp file + os.replace)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, path)
+
     def save_state(self, path: str = "plot_state.json"):
-        with open(path, "w") as f:
-            json.dump({
-                "version": self.version,
-                "features": self.features,
-                "history": self.history,
-                "improvements": self.improvements,
-                "plot_history": self.plot_history  # NEW
-            }, f, indent=2)
+        self.write_state(path, self.to_dict())
 
     def load_state(self, path: str = "plot_state.json"):
         if not os.path.exists(path):
@@ -166,7 +317,10 @@ class PlotGenerator:
         with open(path) as f:
             state = json.load(f)
         self.version = state.get("version", self.version)
-        self.features.update(state.get("features", {}))
+        # JSON-decoded keys are not interned; intern so key hashing/lookups stay cheap
+        self.features.update({sys.intern(k): v for k, v in state.get("features", {}).items()})
+        self._features_version += 1
         self.history = state.get("history", self.history)
         self.improvements = state.get("improvements", self.improvements)
         self.plot_history = state.get("plot_history", self.plot_history)  # NEW
+        self.recent_plots = deque(self.plot_history, maxlen=self.recent_plots.maxlen)
@@ -1,10 +1,153 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import json
+import sys
 import os
+import time
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from keyword_scanner import shared_scanner
+try:
+    import pyarrow  # noqa: F401  optional: enables the on-disk Feather price cache
+except ImportError:
+    pyarrow = None
+try:
+    from numba import njit  # optional: compiled single-pass RSI kernel
+except ImportError:
+    njit = None
+
+# Seconds a downloaded history stays fresh in the process-wide fetch cache
+FETCH_TTL = 900
+# On-disk history cache (Feather, memory-mapped on read); survives app restarts within FETCH_TTL
+CACHE_DIR = Path("artifacts") / "cache"
+
+
+def _wilder_rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """Wilder RSI in one pass; same values as the ewm(alpha=1/period, adjust=False) pandas path."""
+    n = close.shape[0]
+    out = np.empty(n)
+    out[:] = np.nan
+    if n < 2:
+        return out
+    alpha = 1.0 / period
+    d = close[1] - close[0]
+    gain = d if d > 0 else 0.0
+    loss = -d if d < 0 else 0.0
+    for i in range(1, n):
+        if i > 1:
+            d = close[i] - close[i - 1]
+            gain = (1.0 - alpha) * gain + alpha * (d if d > 0 else 0.0)
+            loss = (1.0 - alpha) * loss + alpha * (-d if d < 0 else 0.0)
+        if loss > 0:
+            out[i] = 100.0 - 100.0 / (1.0 + gain / loss)
+    return out
+
+
+_wilder_rsi_jit = njit(cache=True)(_wilder_rsi) if njit is not None else None
+
+
+def _first_last_closes(frames: List[pd.DataFrame]):
+    """First and last Close of each (non-empty) frame as two float64 arrays."""
+    n = len(frames)
+    firsts = np.fromiter((df['Close'].iat[0] for df in frames), dtype=np.float64, count=n)
+    lasts = np.fromiter((df['Close'].iat[-1] for df in frames), dtype=np.float64, count=n)
+    return firsts, lasts
+
+
+def _naive_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop the index timezone (keeping local dates): yf.download returns naive daily indexes,
+    Ticker.history tz-aware ones, and the two cannot be aligned in one frame."""
+    tz = getattr(df.index, "tz", None)
+    if tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df
+
+
+def _cache_path(symbol: str, start: str) -> Path:
+    return CACHE_DIR / f"{hashlib.blake2b(f'{symbol}|{start}'.encode(), digest_size=8).hexdigest()}.feather"
+
+
+def _read_cached_frame(symbol: str, start: str) -> Optional[pd.DataFrame]:
+    """Memory-mapped read of a fresh cached history; None on miss/stale/unavailable."""
+    if pyarrow is None:
+        return None
+    path = _cache_path(symbol, start)
+    try:
+        if time.time() - path.stat().st_mtime > FETCH_TTL:
+            return None
+        df = pd.read_feather(path, memory_map=True)
+    except (OSError, ValueError):
+        return None
+    return _naive_index(df.set_index(df.columns[0]))  # files written before normalization may be tz-aware
+
+
+def _write_cached_frame(symbol: str, start: str, df: pd.DataFrame):
+    """Persist a raw (un-enriched) history; failures only cost a future re-fetch."""
+    if pyarrow is None or df.empty:
+        return
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.reset_index().to_feather(_cache_path(symbol, start))
+    except (OSError, ValueError):
+        pass
+
+
+class _EmptyFetch(Exception):
+    """Raised out of the lru_cached fetchers so empty results (how yfinance reports transient
+    failures) are returned to the caller but never memoized; carries the uncached result."""
+
+    def __init__(self, result):
+        super().__init__("empty yfinance result")
+        self.result = result
+
+
+@lru_cache(maxsize=128)
+def _fetch_history_cached(symbol: str, start: str, end: Optional[str], ttl_bucket: int) -> pd.DataFrame:
+    import yfinance as yf  # deferred: pulls in requests/lxml, only needed on a cache miss
+    df = _naive_index(yf.Ticker(symbol).history(start=start, end=end))
+    if df.empty:
+        raise _EmptyFetch(df)
+    return df
+
+
+def _fetch_history(symbol: str, start: str, end: Optional[str] = None) -> pd.DataFrame:
+    """Process-wide cached yfinance history; returns a copy since callers enrich frames in place."""
+    try:
+        return _fetch_history_cached(symbol, start, end, int(time.time() // FETCH_TTL)).copy()
+    except _EmptyFetch as e:
+        return e.result
+
+
+def _split_download(raw: pd.DataFrame, symbols: tuple) -> Dict[str, pd.DataFrame]:
+    """Slice a yf.download(group_by='ticker') frame into one frame per symbol (empty if missing)."""
+    if isinstance(raw.columns, pd.MultiIndex):
+        present = set(raw.columns.get_level_values(0))
+        return {s: _naive_index(raw[s].dropna(how="all")) if s in present else pd.DataFrame() for s in symbols}
+    # older yfinance returns flat columns for a single ticker
+    return {symbols[0]: _naive_index(raw.dropna(how="all"))} if len(symbols) == 1 else {s: pd.DataFrame() for s in symbols}
+
+
+@lru_cache(maxsize=32)
+def _fetch_histories_cached(symbols: tuple, start: str, end: Optional[str], ttl_bucket: int) -> Dict[str, pd.DataFrame]:
+    import yfinance as yf  # deferred, see _fetch_history_cached
+    raw = yf.download(list(symbols), start=start, end=end, group_by="ticker",
+                      auto_adjust=True, threads=True, progress=False)
+    frames = _split_download(raw, symbols)
+    if any(df.empty for df in frames.values()):
+        raise _EmptyFetch(frames)  # partial/failed batch: usable now, retried on the next call
+    return frames
+
+
+def _fetch_histories(symbols: List[str], start: str, end: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """One batched yfinance request for several symbols; cached like _fetch_history, copies returned."""
+    try:
+        frames = _fetch_histories_cached(tuple(symbols), start, end, int(time.time() // FETCH_TTL))
+    except _EmptyFetch as e:
+        return e.result
+    return {s: df.copy() for s, df in frames.items()}
 
 
 class StockDataService:
@@ -31,14 +174,21 @@ class StockDataService:
         }
         self.history = []
         self.cache: Dict[str, pd.DataFrame] = {}
+        # start date each cached frame was fetched from; a different start is a cache miss
+        self._cache_start: Dict[str, str] = {}
+        # Bumped on every capability mutation; drives the active_features_str memo
+        self._features_version = 0
+        self._active_str_version = -1
+        self._active_features_str = ""
 
     def evolve(self, feedback: str):
         """Toggle capabilities inferred from feedback; bump version."""
         self.version += 1
         fb = feedback.lower()
-        for k, cap in self._kw_map.items():
-            if k in fb:
-                self.capabilities[cap] = True
+        # one pass for all keywords; keyed by the current map so extensions are picked up
+        for k in shared_scanner(tuple(self._kw_map)).scan(fb):
+            self.capabilities[self._kw_map[k]] = True
+        self._features_version += 1
         self.history.append({
             "version": self.version,
             "feedback": feedback[:160],
@@ -46,56 +196,95 @@ class StockDataService:
             "ts": datetime.now().isoformat()
         })
 
+    @property
+    def active_features_str(self) -> str:
+        """Comma-joined enabled capability names; recomputed only after a mutation."""
+        if self._active_str_version != self._features_version:
+            self._active_features_str = ", ".join(k for k, v in self.capabilities.items() if v)
+            self._active_str_version = self._features_version
+        return self._active_features_str
+
     def clear_cache(self, symbols: Optional[List[str]] = None):
         if symbols is None:
             self.cache.clear()
+            self._cache_start.clear()
         else:
             for s in symbols:
                 self.cache.pop(s, None)
+                self._cache_start.pop(s, None)
 
     def get_stock_prices(self, symbols: List[str], start_date: Optional[str] = None) -> Dict[str, pd.DataFrame]:
         """Fetch + lightweight enrich; caches per symbol."""
         if not start_date:
             start_date = f"{datetime.now().year}-01-01"
         out: Dict[str, pd.DataFrame] = {}
+        missing = []
+        for s in symbols:
+            if self._cache_start.get(s) != start_date:
+                self.cache.pop(s, None)  # fetched for another start date
+            if self.cache.get(s) is None or self.cache[s].empty:
+                df = _read_cached_frame(s, start_date)
+                if df is None:
+                    missing.append(s)
+                else:
+                    self.cache[s] = df
+        if missing:
+            # one HTTP round-trip for all uncached symbols (even a single one) instead of one per symbol
+            try:
+                fetched = _fetch_histories(missing, start_date)
+            except Exception:
+                fetched = {}
+            for s, df in fetched.items():
+                _write_cached_frame(s, start_date, df)
+            self.cache.update(fetched)
         for sym in symbols:
             df = self.cache.get(sym)
             if df is None or df.empty:
+                # batch request failed or came back empty for it: retry this symbol on its own
                 try:
-                    df = yf.Ticker(sym).history(start=start_date)
+                    df = _fetch_history(sym, start_date)
                 except Exception:
                     df = pd.DataFrame()
+                _write_cached_frame(sym, start_date, df)
                 self.cache[sym] = df
             if not df.empty:
                 if self.capabilities["moving_avg"]:
                     self._add_moving_avg(df)
                 if self.capabilities["rsi"]:
                     self._add_rsi(df)
-                if self.capabilities["volatility"]:
-                    df.attrs["volatility"] = self._annualized_vol(df)
+            self._cache_start[sym] = start_date
             out[sym] = df
+        if self.capabilities["volatility"]:
+            self._add_volatility(out)
         return out
 
     def calculate_ytd_gains(self, data: Dict[str, pd.DataFrame]) -> Dict[str, float]:
-        gains = {}
-        for sym, df in data.items():
-            if not df.empty:
-                gains[sym] = (df['Close'].iloc[-1] / df['Close'].iloc[0] - 1) * 100
-        return gains
+        syms = [sym for sym, df in data.items() if not df.empty]
+        firsts, lasts = _first_last_closes([data[sym] for sym in syms])
+        return dict(zip(syms, (lasts / firsts - 1.0) * 100.0))
 
     def get_enhanced_metrics(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
         """Return minimal metrics; extend as evolution proceeds."""
         metrics: Dict[str, Dict[str, Any]] = {}
+        frames = {}
         for sym in symbols:
             df = self.cache.get(sym)
-            if df is None or df.empty:
-                continue
+            if df is not None and not df.empty:
+                frames[sym] = df
+        firsts, lasts = _first_last_closes(list(frames.values()))
+        gains = (lasts / firsts - 1.0) * 100.0
+        if self.capabilities["volatility"]:
+            # one stacked pass for every frame still missing a cached volatility
+            missing = {s: df for s, df in frames.items() if "volatility" not in df.attrs}
+            if missing:
+                self._add_volatility(missing)
+        for i, (sym, df) in enumerate(frames.items()):
             m: Dict[str, Any] = {
-                "ytd_gain": (df['Close'].iloc[-1] / df['Close'].iloc[0] - 1) * 100,
-                "price": df['Close'].iloc[-1]
+                "ytd_gain": gains[i],
+                "price": lasts[i]
             }
             if self.capabilities["volatility"]:
-                m["volatility"] = df.attrs.get("volatility", self._annualized_vol(df))
+                m["volatility"] = df.attrs.get("volatility", 0.0)  # unset only when len(df) < 2
             if self.capabilities["rsi"] and 'RSI' in df.columns:
                 m["rsi"] = float(df['RSI'].iloc[-1])
             metrics[sym] = m
@@ -111,7 +300,14 @@ class StockDataService:
                 closes[s] = df['Close']
         if not closes:
             return pd.DataFrame()
-        return pd.DataFrame(closes).pct_change().corr()
+        panel = pd.DataFrame(closes)
+        arr = panel.to_numpy(dtype=np.float64)
+        if len(arr) < 3 or np.isnan(arr).any():
+            return panel.pct_change().corr()  # misaligned dates / too short: pandas' pairwise-complete path
+        rets = np.diff(arr, axis=0) / arr[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):  # flat series -> NaN, as pandas reports
+            corr = np.atleast_2d(np.corrcoef(rets, rowvar=False))
+        return pd.DataFrame(corr, index=panel.columns, columns=panel.columns)
 
     # --- Helpers (kept tiny; extension hooks) ---
     def _add_moving_avg(self, df: pd.DataFrame):
@@ -121,17 +317,43 @@ class StockDataService:
     def _add_rsi(self, df: pd.DataFrame, period: int = 14):
         if 'RSI' in df.columns:
             return
+        if _wilder_rsi_jit is not None:
+            close = df['Close'].to_numpy(dtype=np.float64)
+            if not np.isnan(close).any():  # the kernel has no NaN-skipping; gaps use the pandas path
+                df['RSI'] = _wilder_rsi_jit(close, period)
+                return
         delta = df['Close'].diff()
-        gain = delta.where(delta > 0, 0).rolling(period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
+        # Wilder smoothing: one EWMA pass per side, no boolean-mask temporaries
+        gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
         rs = gain / loss.replace(0, np.nan)
         df['RSI'] = 100 - (100 / (1 + rs))
 
-    def _annualized_vol(self, df: pd.DataFrame) -> float:
-        if df.empty or len(df) < 2:
-            return 0.0
-        r = df['Close'].pct_change().dropna()
-        return float(r.std() * np.sqrt(252) * 100)
+    def _add_volatility(self, data: Dict[str, pd.DataFrame]):
+        """Annualized vol for all symbols from one std() over the stacked close matrix."""
+        closes = {}
+        for s, df in data.items():
+            if len(df) >= 2:
+                c = df['Close'].to_numpy(dtype=np.float64)
+                closes[s] = c[~np.isnan(c)]
+        if not closes:
+            return
+        # Each column holds its own symbol's closes, top-aligned (not joined on dates), so one
+        # ticker's extra trading days never turn another's returns into gaps; the tail is NaN padding
+        arr = np.full((max(map(len, closes.values())), len(closes)), np.nan)
+        for j, c in enumerate(closes.values()):
+            arr[:len(c), j] = c
+        rets = np.diff(arr, axis=0) / arr[:-1]
+        valid = ~np.isnan(rets)
+        n = valid.sum(axis=0)
+        # NaN-skipping sample std per column (pandas std semantics); fewer than two returns -> 0.0
+        mean = np.where(valid, rets, 0.0).sum(axis=0) / np.maximum(n, 1)
+        ss = np.where(valid, rets - mean, 0.0)
+        var = (ss * ss).sum(axis=0) / np.maximum(n - 1, 1)
+        vol = np.sqrt(var) * np.sqrt(252) * 100
+        vol[(n < 2) | np.isnan(vol)] = 0.0
+        for s, v in zip(closes, vol):
+            data[s].attrs["volatility"] = float(v)
 
     # --- Introspection / persistence ---
     def summary(self) -> Dict[str, Any]:
@@ -142,13 +364,17 @@ class StockDataService:
             "cache_symbols": list(self.cache.keys())
         }
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Point-in-time copy of the persisted state."""
+        return {
+            "version": self.version,
+            "capabilities": dict(self.capabilities),
+            "history": list(self.history)
+        }
+
     def save_state(self, path: str = "stock_service_state.json"):
         with open(path, "w") as f:
-            json.dump({
-                "version": self.version,
-                "capabilities": self.capabilities,
-                "history": self.history
-            }, f, indent=2)
+            json.dump(self.to_dict(), f, indent=2)
 
     def load_state(self, path: str = "stock_service_state.json"):
         if not os.path.exists(path):
@@ -156,5 +382,7 @@ class StockDataService:
         with open(path) as f:
             state = json.load(f)
         self.version = state.get("version", self.version)
-        self.capabilities.update(state.get("capabilities", {}))
+        # JSON-decoded keys are not interned; intern so key hashing/lookups stay cheap
+        self.capabilities.update({sys.intern(k): v for k, v in state.get("capabilities", {}).items()})
+        self._features_version += 1
         self.history = state.get("history", self.history)